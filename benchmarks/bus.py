@@ -0,0 +1,62 @@
+"""Several addressed panels sharing one emulated bus line: a producer per panel sends changing frames at its own
+rate (0 sends the same frame over and over), the bus scheduler interleaves them. Reports the effective frame rate
+every panel gets and what was coalesced or skipped as unchanged.
+
+    $ python benchmarks/bus.py [-t SECONDS] [-B BAUD] [-r RATE ...]
+"""
+import time
+import argparse
+import threading
+
+from tlns.tlns import Board
+from tlns.bus import BusScheduler
+from tlns.emulator import VirtualPanel
+
+
+def produce(panel, fps, duration):
+    frame = bytearray(Board.WIDTH * Board.HEIGHT)
+    period = 1.0 / fps if fps else 0.01
+    started = time.monotonic()
+    n = 0
+    while time.monotonic() - started < duration:
+        if fps:
+            frame[n % len(frame)] = n % 255 + 1
+        panel.send(frame)
+        n += 1
+        time.sleep(period)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per panel frame rates on a shared bus')
+    parser.add_argument('-t', '--time', help='Run duration, s', dest='time', type=float, default=5)
+    parser.add_argument('-B', '--baud', help='Emulated line baudrate', dest='baud', type=int, default=115200)
+    parser.add_argument('-r', '--rate', help='Producer frame rate of the next panel, 0 for a still picture '
+                        '(repeatable)', dest='rates', type=float, action='append', default=None)
+    args = parser.parse_args()
+    rates = args.rates or [100, 100, 10, 0]
+
+    addresses = list(range(1, len(rates) + 1))
+    with VirtualPanel(baudrate=args.baud, addresses=addresses) as line:
+        bus = BusScheduler(line.device, args.baud)
+        panels = [bus.panel(address) for address in addresses]
+        producers = [threading.Thread(target=produce, args=(panel, fps, args.time))
+                     for panel, fps in zip(panels, rates)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        time.sleep(0.2)
+        print('{:>8} {:>8} {:>8} {:>9} {:>10} {:>10}'.format('address', 'rate', 'sent', 'fps', 'coalesced',
+                                                             'unchanged'))
+        for panel, fps in zip(panels, rates):
+            stats = panel.stats
+            print('{:>8} {:>8.0f} {:>8} {:>9.1f} {:>10} {:>10}'.format(
+                panel.address, fps, stats.frames_sent, stats.frames_sent / args.time, stats.frames_dropped,
+                stats.frames_skipped))
+        for panel in panels:
+            panel.close()
+        print(line.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Delivered frames per second over a noisy pty line: plain HDLC (corrupted frames are lost) against the
+tinyproto full duplex transport with different window sizes (corrupted frames are retransmitted).
+Use it to pick the --reliable window for a line with a given error rate.
+
+    $ python benchmarks/fd_window.py [-t SECONDS] [-B BAUD] [-e ERROR_RATE ...] [-w WINDOW ...]
+"""
+import time
+import argparse
+
+from tlns.tlns import Board
+from tlns.link import SerialSink
+from tlns.transport import FdSink
+from tlns.emulator import VirtualPanel, PROTOCOL_FD
+
+
+def produce(sink, duration):
+    frame = bytearray(Board.WIDTH * Board.HEIGHT)
+    started = time.monotonic()
+    n = 0
+    while time.monotonic() - started < duration:
+        frame[n % len(frame)] = n % 256
+        sink.send(frame)
+        n += 1
+        time.sleep(0.0005)
+
+
+def run_hdlc(args, error_rate):
+    with VirtualPanel(error_rate=error_rate, baudrate=args.baud, seed=1) as panel:
+        sink = SerialSink(panel.device, args.baud)
+        produce(sink, args.time)
+        sink.close()
+        time.sleep(0.1)
+        return panel.frames_shown / args.time, sink.stats.frames_sent, '-', '-'
+
+
+def run_fd(args, error_rate, window):
+    with VirtualPanel(protocol=PROTOCOL_FD, error_rate=error_rate, baudrate=args.baud, seed=1) as panel:
+        sink = FdSink(panel.device, args.baud, window, retry_timeout=args.retry_timeout)
+        produce(sink, args.time)
+        stats = sink.stats
+        result = (stats.delivered_fps(), stats.frames_sent, stats.retransmits(),
+                  '{:.1f}'.format(stats.rtt * 1e3) if stats.rtt is not None else '-')
+        sink.close()
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reliable transport window benchmark')
+    parser.add_argument('-t', '--time', help='Seconds per run', dest='time', type=float, default=5)
+    parser.add_argument('-B', '--baud', help='Emulated line baudrate', dest='baud', type=int, default=115200)
+    parser.add_argument('-e', '--error-rate', help='Bit flip probability per byte (repeatable)', dest='error_rates',
+                        type=float, action='append')
+    parser.add_argument('-w', '--window', help='Window size (repeatable)', dest='windows', type=int,
+                        action='append')
+    parser.add_argument('--retry-timeout', dest='retry_timeout', type=float, default=FdSink.RETRY_TIMEOUT)
+    args = parser.parse_args()
+
+    print('{:>10} {:>8} {:>10} {:>8} {:>12} {:>8}'.format(
+        'error rate', 'mode', 'frames/s', 'sent', 'retransmits', 'rtt ms'))
+    for error_rate in args.error_rates or [0.0, 1e-4, 1e-3]:
+        rows = [('hdlc',) + run_hdlc(args, error_rate)]
+        for window in args.windows or [1, 2, 4, 7]:
+            rows.append(('fd w={}'.format(window),) + run_fd(args, error_rate, window))
+        for mode, fps, sent, retransmits, rtt in rows:
+            print('{:>10g} {:>8} {:>10.1f} {:>8} {:>12} {:>8}'.format(error_rate, mode, fps, sent, retransmits, rtt))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Latency of a producer faster than the line: frames written straight to the device queue up in the OS buffer,
+the governor paces them to the measured link cost and drops the surplus. Every frame carries its number, the
+panel is sampled to see how old the frame it shows is.
+
+    $ python benchmarks/governor.py [-t SECONDS] [-B BAUD] [-f PRODUCER_FPS] [--headroom H ...]
+"""
+import time
+import struct
+import argparse
+import threading
+
+from tlns.tlns import Board
+from tlns.link import SerialSink
+from tlns.governor import Governor
+from tlns.emulator import VirtualPanel
+
+SERIAL = struct.Struct('<I')
+SAMPLE_INTERVAL = 0.01
+
+
+def produce(sink, fps, duration, sent_at):
+    frame = bytearray(Board.WIDTH * Board.HEIGHT)
+    started = time.monotonic()
+    n = 0
+    while time.monotonic() - started < duration:
+        SERIAL.pack_into(frame, 0, n)
+        sent_at.append(time.monotonic())
+        sink.send(frame)
+        n += 1
+        time.sleep(1.0 / fps)
+
+
+def sample(panel, sent_at, latencies, stop):
+    shown = None
+    while not stop.wait(SAMPLE_INTERVAL):
+        n = SERIAL.unpack_from(panel.frame)[0]
+        if n != shown and n < len(sent_at):
+            shown = n
+            latencies.append(time.monotonic() - sent_at[n])
+
+
+def run(args, headroom):
+    with VirtualPanel(baudrate=args.baud) as panel:
+        sink = SerialSink(panel.device, args.baud)
+        if headroom:
+            sink = Governor(sink, args.baud, headroom)
+        sent_at, latencies = [], []
+        stop = threading.Event()
+        sampler = threading.Thread(target=sample, args=(panel, sent_at, latencies, stop))
+        sampler.start()
+        produce(sink, args.fps, args.time, sent_at)
+        stop.set()
+        sampler.join()
+        shown = panel.frames_shown
+        sink.close()
+        latencies.sort()
+        return (shown / args.time, sink.stats.frames_dropped if headroom else 0,
+                sum(latencies) / max(len(latencies), 1), latencies[-1] if latencies else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame latency with and without the governor')
+    parser.add_argument('-t', '--time', help='Run duration, s', dest='time', type=float, default=5)
+    parser.add_argument('-B', '--baud', help='Emulated line baudrate', dest='baud', type=int, default=115200)
+    parser.add_argument('-f', '--fps', help='Producer frame rate', dest='fps', type=float, default=100)
+    parser.add_argument('--headroom', help='Governor headroom to try, 0 writes straight to the device (repeatable)',
+                        dest='headrooms', type=float, action='append', default=None)
+    args = parser.parse_args()
+
+    print('{:>10} {:>9} {:>9} {:>14} {:>14}'.format('governor', 'fps', 'dropped', 'latency, ms', 'max, ms'))
+    for headroom in args.headrooms or [0, Governor.HEADROOM]:
+        fps, dropped, latency, worst = run(args, headroom)
+        print('{:>10} {:>9.1f} {:>9} {:>14.1f} {:>14.1f}'.format(headroom or 'off', fps, dropped, latency * 1000,
+                                                              worst * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Replays a tlns_gui input recording (tlns_gui.py --record FILE) into MainWindow under the offscreen Qt platform
+and reports the time spent handling every event, the time spent repainting after it and the frames it sent.
+Without a recording a synthetic session is replayed, so the numbers are comparable from run to run.
+Events are replayed at their original pace or, with --flat-out, back to back.
+
+    $ QT_QPA_PLATFORM=offscreen python benchmarks/gui_replay.py [FILE] [--flat-out] [-n EVENTS] [-r REPEAT]
+                                                                [-d loop://] [-B BAUD] [--coverage]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+from tlns.link import SerialSink, DEFAULT_BAUDRATE
+from tlns.inputlog import EVENT_MOVE, EVENT_PRESS, EVENTS, read_events, synthetic_events
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+LOOPBACK = 'loop://'
+
+
+class LoopbackSink(SerialSink):
+    """SerialSink on pyserial's loopback with a thread reading the frames back: the loopback blocks writes once
+    its 4 KiB buffer is full"""
+
+    def __init__(self, baudrate=DEFAULT_BAUDRATE):
+        super().__init__(LOOPBACK, baudrate)
+        self._ser.timeout = 0.1
+        self.bytes_read = 0
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._drain, name='loopback_drain', daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while self._keep_going:
+            self.bytes_read += len(self._ser.read(4096))
+
+    def close(self):
+        self._keep_going = False
+        self._thread.join()
+        super().close()
+
+
+def percentile(values, q):
+    """values sorted"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Timings:
+    def __init__(self):
+        self.handle = dict((kind, []) for kind in EVENTS)
+        self.paint = dict((kind, []) for kind in EVENTS)
+        self.frames = dict((kind, 0) for kind in EVENTS)
+        self.wall = 0.0
+
+    def report(self) -> str:
+        lines = ['{:>6} {:>8} {:>7} | {:>9} {:>9} {:>9} {:>9} | {:>9} {:>9}  (us)'.format(
+            'event', 'count', 'frames', 'mean', 'p50', 'p99', 'max', 'paint', 'p99')]
+        for kind in EVENTS:
+            handle, paint = sorted(self.handle[kind]), sorted(self.paint[kind])
+            if not handle:
+                continue
+            lines.append('{:>6} {:>8} {:>7} | {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} | {:>9.1f} {:>9.1f}'.format(
+                kind, len(handle), self.frames[kind], sum(handle) / len(handle) * 1e6, percentile(handle, 0.5) * 1e6,
+                percentile(handle, 0.99) * 1e6, handle[-1] * 1e6, sum(paint) / len(paint) * 1e6,
+                percentile(paint, 0.99) * 1e6))
+        events = sum(len(v) for v in self.handle.values())
+        lines.append('{} events in {:.2f} s ({:.0f} events/s), {} frames sent'.format(
+            events, self.wall, events / max(self.wall, 1e-9), sum(self.frames.values())))
+        return '\n'.join(lines)
+
+
+def replay(app, window, events, flat_out, timings):
+    from PyQt5 import QtCore, QtGui
+
+    kinds = {EVENT_MOVE: QtCore.QEvent.MouseMove, EVENT_PRESS: QtCore.QEvent.MouseButtonPress}
+    handlers = {EVENT_MOVE: window.mouseMoveEvent, EVENT_PRESS: window.mousePressEvent}
+    stats = window.sink.stats
+    started = time.monotonic()
+    for event in events:
+        if not flat_out:
+            while time.monotonic() - started < event.t:
+                app.processEvents()
+                time.sleep(min(0.001, max(0.0, event.t - (time.monotonic() - started))))
+        button = QtCore.Qt.MouseButton(event.buttons)
+        e = QtGui.QMouseEvent(kinds[event.kind], QtCore.QPointF(event.x, event.y), button,
+                              QtCore.Qt.MouseButtons(event.buttons), QtCore.Qt.NoModifier)
+        frames = stats.frames_sent
+        t0 = time.perf_counter()
+        handlers[event.kind](e)
+        t1 = time.perf_counter()
+        app.processEvents()
+        t2 = time.perf_counter()
+        timings.handle[event.kind].append(t1 - t0)
+        timings.paint[event.kind].append(t2 - t1)
+        timings.frames[event.kind] += stats.frames_sent - frames
+    timings.wall += time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays tlns_gui mouse input headlessly and times its handling')
+    parser.add_argument('recording', help='File written by tlns_gui.py --record, synthetic input if omitted',
+                        nargs='?', default=None)
+    parser.add_argument('--flat-out', help='No pauses between events', dest='flat_out', action='store_true')
+    parser.add_argument('-n', '--events', help='Synthetic mouse moves', dest='events', type=int, default=5000)
+    parser.add_argument('-r', '--repeat', help='Replay the input this many times', dest='repeat', type=int,
+                        default=1)
+    parser.add_argument('-d', '--device', help='Serial device or pyserial URL', dest='device', type=str,
+                        default=LOOPBACK)
+    parser.add_argument('-B', '--baud', help='Baudrate', dest='baud', type=int, default=DEFAULT_BAUDRATE)
+    parser.add_argument('--coverage', help='Run the window in coverage mode (tlns_gui.py --coverage)',
+                        dest='coverage', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    sys.path.insert(0, SCRIPTS)
+    from PyQt5.QtWidgets import QApplication
+    import tlns_gui
+
+    app = QApplication(sys.argv[:1])
+    sink = LoopbackSink(args.baud) if args.device == LOOPBACK else SerialSink(args.device, args.baud)
+    timings = Timings()
+    window = tlns_gui.MainWindow(sink, coverage=args.coverage)
+    window.show()
+    app.processEvents()
+    if args.recording:
+        events = read_events(args.recording)
+    else:
+        events = synthetic_events(args.events, tlns_gui.WINDOW_WIDTH, tlns_gui.WINDOW_HEIGHT)
+    for _ in range(args.repeat):
+        replay(app, window, events, args.flat_out, timings)
+    sink.close()
+    print(timings.report())
+    print(sink.report())
+
+
+if __name__ == '__main__':
+    main()
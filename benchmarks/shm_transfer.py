@@ -0,0 +1,135 @@
+"""Producer -> transmitter frame transfer: multiprocessing Queue (pickled Board), Pipe (raw bytes)
+and SharedBoard (rendered in place, seqlock snapshot).
+Reports CPU time spent per frame on each side and how many frames the transmitter got.
+SharedBoard has newest-frame semantics: the transmitter skips generations it was too slow to see.
+
+    $ python benchmarks/shm_transfer.py [-n FRAMES] [--fps FPS] [-W WIDTH] [-H HEIGHT]
+"""
+import time
+import argparse
+import multiprocessing as mp
+
+from tlns.tlns import Board, PIXEL_MAX_BRIGHTNESS
+from tlns.shm import SharedBoard, TornRead
+
+SHM_NAME = 'tlns_bench_board'
+POLL_INTERVAL = 0.0005
+
+
+def render(board, n):
+    x = n % board.w
+    for y in range(board.h):
+        board.set(x, y, PIXEL_MAX_BRIGHTNESS)
+        board.set((x - 1) % board.w, y, 0)
+
+
+def pace(started, n, period):
+    delay = started + n * period - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def queue_producer(queue, frames, period, w, h, result):
+    board = Board(w, h)
+    started = time.perf_counter()
+    for n in range(frames):
+        render(board, n)
+        queue.put(board)
+        pace(started, n, period)
+    queue.put(None)
+    result.put(('producer', time.process_time()))
+
+
+def queue_consumer(queue, frames, result):
+    received = 0
+    while True:
+        board = queue.get()
+        if board is None:
+            break
+        board.tobytes()
+        received += 1
+    result.put(('consumer', time.process_time(), received))
+
+
+def pipe_producer(pipe, frames, period, w, h, result):
+    _, conn = pipe
+    board = Board(w, h)
+    started = time.perf_counter()
+    for n in range(frames):
+        render(board, n)
+        conn.send_bytes(board.tobytes())
+        pace(started, n, period)
+    conn.send_bytes(b'')
+    result.put(('producer', time.process_time()))
+
+
+def pipe_consumer(pipe, frames, result):
+    conn, _ = pipe
+    received = 0
+    while conn.recv_bytes():
+        received += 1
+    result.put(('consumer', time.process_time(), received))
+
+
+def shm_producer(_, frames, period, w, h, result):
+    board = SharedBoard(SHM_NAME, untrack=False)
+    started = time.perf_counter()
+    for n in range(frames):
+        with board.write():
+            render(board, n)
+        pace(started, n, period)
+    board.close()
+    result.put(('producer', time.process_time()))
+
+
+def shm_consumer(_, frames, result):
+    board = SharedBoard(SHM_NAME, untrack=False)
+    last_generation = 0
+    received = 0
+    while last_generation < 2 * frames:
+        if board.generation == last_generation:
+            time.sleep(POLL_INTERVAL)
+            continue
+        try:
+            last_generation, _ = board.read(bytes)
+        except TornRead:
+            continue
+        received += 1
+    board.close()
+    result.put(('consumer', time.process_time(), received))
+
+
+def run(name, producer, consumer, channel, args):
+    result = mp.Queue()
+    period = 1 / args.fps if args.fps else 0
+    producer = mp.Process(target=producer, args=(channel, args.frames, period, args.w, args.h, result))
+    consumer = mp.Process(target=consumer, args=(channel, args.frames, result))
+    started = time.perf_counter()
+    consumer.start()
+    producer.start()
+    reports = dict((report[0], report[1:]) for report in (result.get(), result.get()))
+    producer.join()
+    consumer.join()
+    elapsed = time.perf_counter() - started
+    print('{:6} {:9.0f} frames/s  producer {:6.1f} us/frame  transmitter {:6.1f} us/frame  received {}'.format(
+        name, args.frames / elapsed, reports['producer'][0] / args.frames * 1e6,
+        reports['consumer'][0] / args.frames * 1e6, reports['consumer'][1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-process frame transfer benchmark')
+    parser.add_argument('-n', '--frames', dest='frames', type=int, default=5000)
+    parser.add_argument('--fps', help='Producer frame rate, 0 for as fast as possible', dest='fps', type=float,
+                        default=1000)
+    parser.add_argument('-W', '--width', dest='w', type=int, default=Board.WIDTH)
+    parser.add_argument('-H', '--height', dest='h', type=int, default=Board.HEIGHT)
+    args = parser.parse_args()
+
+    run('queue', queue_producer, queue_consumer, mp.Queue(maxsize=64), args)
+    run('pipe', pipe_producer, pipe_consumer, mp.Pipe(duplex=False), args)
+    with SharedBoard(SHM_NAME, args.w, args.h, create=True):
+        run('shm', shm_producer, shm_consumer, None, args)
+
+
+if __name__ == '__main__':
+    main()
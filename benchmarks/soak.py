@@ -0,0 +1,267 @@
+"""Soak run: tlns_gui's MainWindow (offscreen Qt, synthetic mouse input) and snake's game logic (headless,
+autopilot) each drive a pty backed virtual panel for a given time. RSS, traced Python memory, the sizes of the
+session structures, the achieved frame rates and write latencies are sampled on the way; a series growing
+linearly or drifting by more than the threshold over the run is flagged and makes the exit code 1.
+The allocation sites that grew the most are listed at the end.
+
+    $ python benchmarks/soak.py [-t SECONDS] [-i INTERVAL] [-B BAUD] [--no-gui] [--no-snake]
+"""
+import os
+import sys
+import math
+import time
+import types
+import argparse
+import threading
+import tracemalloc
+import contextlib
+
+from tlns.link import SerialSink
+from tlns.emulator import VirtualPanel
+from tlns.autopilot import Autopilot
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+# Left out of the allocation growth: tracemalloc's own snapshots and the import machinery
+SNAPSHOT_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'))
+CORRELATION_MIN = 0.8   # A series has to be this close to a line to count as growing or drifting, not noisy
+
+
+def linear_fit(ts, vs):
+    """Least squares slope and correlation coefficient"""
+    n = len(ts)
+    mean_t, mean_v = sum(ts) / n, sum(vs) / n
+    stt = sum((t - mean_t) ** 2 for t in ts)
+    svv = sum((v - mean_v) ** 2 for v in vs)
+    stv = sum((t - mean_t) * (v - mean_v) for t, v in zip(ts, vs))
+    if not stt:
+        return 0.0, 0.0
+    return stv / stt, stv / math.sqrt(stt * svv) if svv else 0.0
+
+
+class Series:
+    """Memory like series (leak=True) are flagged when they grow linearly, rates when they drift either way"""
+
+    def __init__(self, name, unit, leak):
+        self.name = name
+        self.unit = unit
+        self.leak = leak
+        self.samples = []
+
+    def add(self, t, value):
+        if value is not None:
+            self.samples.append((t, value))
+
+    def verdict(self, warmup, threshold):
+        samples = [s for s in self.samples if s[0] >= warmup]
+        if len(samples) < 3:
+            return None, 0.0, 0.0, 'too short'
+        ts, vs = [s[0] for s in samples], [s[1] for s in samples]
+        slope, r = linear_fit(ts, vs)
+        mean = sum(vs) / len(vs)
+        change = slope * (ts[-1] - ts[0]) / max(abs(mean), 1.0)
+        if self.leak:
+            flagged = change > threshold and r > CORRELATION_MIN
+        else:
+            flagged = abs(change) > threshold and abs(r) > CORRELATION_MIN
+        return flagged, slope * 3600, change, 'GROWS' if flagged and self.leak else 'DRIFTS' if flagged else 'ok'
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10  # Peak, not current
+
+
+class LinkProbe:
+    """Frame rate at the panel and mean write latency at the sink between two samples"""
+
+    def __init__(self, panel, sink):
+        self.panel = panel
+        self.sink = sink
+        self._last = (time.monotonic(), panel.frames_shown, sink.stats.frames_sent, sink.stats.write_time)
+
+    def sample(self):
+        now, shown, sent, write_time = (time.monotonic(), self.panel.frames_shown, self.sink.stats.frames_sent,
+                                        self.sink.stats.write_time)
+        last_now, last_shown, last_sent, last_write_time = self._last
+        self._last = now, shown, sent, write_time
+        latency = (write_time - last_write_time) / (sent - last_sent) * 1e3 if sent != last_sent else None
+        return (shown - last_shown) / (now - last_now), latency
+
+
+def headless_dpg(speed):
+    """Stands in for dearpygui so snake.py's game logic runs without a window: every call is a no-op,
+    get_value() gives the snake speed slider value"""
+    dpg = types.ModuleType('dearpygui.dearpygui')
+    dpg.__getattr__ = lambda name: (lambda *args, **kwargs: None)
+    dpg.get_value = lambda *args, **kwargs: speed
+    package = types.ModuleType('dearpygui')
+    package.dearpygui = dpg
+    return package, dpg
+
+
+def start_snake(panel, args):
+    package, dpg = headless_dpg(args.snake_speed)
+    sys.modules['dearpygui'], sys.modules['dearpygui.dearpygui'] = package, dpg
+    sys.modules.setdefault('theme_settings', types.ModuleType('theme_settings'))
+    sys.path.insert(0, SCRIPTS)
+    import snake
+
+    snake.serial_iface = SerialSink(panel.device, args.baud)
+    snake.autopilot = Autopilot(1, 1, snake.BOARD_HEIGHT - 1, snake.BOARD_WIDTH - 1)
+    snake.initial_slither_points()
+    snake.place_apple()
+    thread = threading.Thread(target=snake.move_snake, name='snake', daemon=True)
+    thread.start()
+    return snake, thread
+
+
+def stop_snake(snake, thread):
+    snake.manual = True  # move_snake() returns after the current step
+    thread.join()
+
+
+class MouseDriver:
+    """Sweeps the cursor over the window along a Lissajous curve, clicks every click_every moves and clears
+    the window (right click) every clear_every clicks, so the session structures reach a steady state"""
+
+    def __init__(self, window, rate, click_every, clear_every):
+        from PyQt5 import QtCore
+        self.window = window
+        self.click_every = click_every
+        self.clear_every = clear_every
+        self.moves = 0
+        self._timer = QtCore.QTimer()
+        self._timer.timeout.connect(self._tick)
+        self._timer.start(max(1, int(1000 / rate)))
+
+    def _event(self, kind, x, y, button):
+        from PyQt5 import QtCore, QtGui
+        return QtGui.QMouseEvent(kind, QtCore.QPointF(x, y), button, button, QtCore.Qt.NoModifier)
+
+    def _tick(self):
+        from PyQt5 import QtCore
+        size = self.window.canvas.size()
+        t = self.moves * 0.01
+        x = int((math.sin(3 * t) + 1) / 2 * (size.width() - 1))
+        y = int((math.sin(4 * t + 1) + 1) / 2 * (size.height() - 1))
+        self.window.mouseMoveEvent(self._event(QtCore.QEvent.MouseMove, x, y, QtCore.Qt.NoButton))
+        self.moves += 1
+        if self.moves % self.click_every == 0:
+            clear = self.moves % (self.click_every * self.clear_every) == 0
+            button = QtCore.Qt.RightButton if clear else QtCore.Qt.LeftButton
+            self.window.mousePressEvent(self._event(QtCore.QEvent.MouseButtonPress, x, y, button))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long running memory and rate drift check')
+    parser.add_argument('-t', '--time', help='Run duration, s', dest='time', type=float, default=600)
+    parser.add_argument('-i', '--interval', help='Sampling interval, s', dest='interval', type=float, default=5)
+    parser.add_argument('-B', '--baud', help='Emulated line baudrate', dest='baud', type=int, default=115200)
+    parser.add_argument('--no-gui', help='Leave out tlns_gui', dest='gui', action='store_false')
+    parser.add_argument('--no-snake', help='Leave out snake', dest='snake', action='store_false')
+    parser.add_argument('--snake-speed', help='Snake speed slider value, 1..10', dest='snake_speed', type=int,
+                        default=10)
+    parser.add_argument('--mouse-rate', help='Synthetic mouse moves per second', dest='mouse_rate', type=float,
+                        default=100)
+    parser.add_argument('--click-every', help='Mouse moves between clicks', dest='click_every', type=int,
+                        default=50)
+    parser.add_argument('--clear-every', help='Clicks between clearing the window', dest='clear_every', type=int,
+                        default=20)
+    parser.add_argument('--warmup', help='Part of the run left out of the drift fit', dest='warmup', type=float,
+                        default=0.2)
+    parser.add_argument('--threshold', help='Flag a change over the run larger than this part of the mean',
+                        dest='threshold', type=float, default=0.1)
+    parser.add_argument('--top', help='Allocation sites to list', dest='top', type=int, default=10)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    series = dict((name, Series(name, unit, leak)) for name, unit, leak in (
+        ('rss', 'MiB', True), ('traced', 'MiB', True),
+        ('gui_fps', 'fps', False), ('gui_write', 'ms', False), ('gui_trail', 'points', True),
+        ('gui_shots', 'shots', True), ('gui_path_rects', 'cells', True),
+        ('snake_fps', 'fps', False), ('snake_write', 'ms', False), ('snake_changes', 'changes', True)))
+    panels = []
+    probes = {}
+    started = time.monotonic()
+    baseline = []
+
+    app = window = driver = snake = None
+    with contextlib.ExitStack() as stack:
+        if args.gui:
+            os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+            sys.path.insert(0, SCRIPTS)
+            from PyQt5.QtWidgets import QApplication
+            import tlns_gui
+            app = QApplication(sys.argv[:1])
+            panel = stack.enter_context(VirtualPanel(baudrate=args.baud))
+            sink = SerialSink(panel.device, args.baud)
+            stack.callback(sink.close)
+            window = tlns_gui.MainWindow(sink)
+            window.show()
+            driver = MouseDriver(window, args.mouse_rate, args.click_every, args.clear_every)
+            probes['gui'] = LinkProbe(panel, sink)
+            panels.append(panel)
+        if args.snake:
+            panel = stack.enter_context(VirtualPanel(baudrate=args.baud))
+            snake, thread = start_snake(panel, args)
+            stack.callback(snake.serial_iface.close)
+            stack.callback(stop_snake, snake, thread)
+            probes['snake'] = LinkProbe(panel, snake.serial_iface)
+            panels.append(panel)
+
+        def sample():
+            t = time.monotonic() - started
+            if not baseline and t >= args.warmup * args.time:
+                baseline.append(tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS))
+            series['rss'].add(t, rss_mb())
+            series['traced'].add(t, tracemalloc.get_traced_memory()[0] / 2 ** 20)
+            for name, probe in probes.items():
+                fps, latency = probe.sample()
+                series[name + '_fps'].add(t, fps)
+                series[name + '_write'].add(t, latency)
+            if window is not None:
+                series['gui_trail'].add(t, len(window.line))
+                series['gui_shots'].add(t, len(window.shots))
+                series['gui_path_rects'].add(t, len(window.path_rects))
+            if snake is not None:
+                series['snake_changes'].add(t, snake.snapshot.changes)
+            print('{:7.0f} s  rss {:.1f} MiB'.format(t, series['rss'].samples[-1][1]), file=sys.stderr)
+
+        if app is not None:
+            from PyQt5.QtCore import QTimer
+            timer = QTimer()
+            timer.timeout.connect(sample)
+            timer.start(int(args.interval * 1000))
+            QTimer.singleShot(int(args.time * 1000), app.quit)
+            app.exec_()
+        else:
+            while time.monotonic() - started < args.time:
+                time.sleep(args.interval)
+                sample()
+        final = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    flagged = False
+    print('{:>15} {:>9} {:>12} {:>12} {:>10}  {}'.format('series', 'unit', 'last', 'slope/h', 'change', 'verdict'))
+    for s in series.values():
+        if not s.samples:
+            continue
+        bad, slope, change, verdict = s.verdict(args.warmup * args.time, args.threshold)
+        flagged = flagged or bool(bad)
+        print('{:>15} {:>9} {:>12.2f} {:>12.2f} {:>9.1f}%  {}'.format(
+            s.name, s.unit, s.samples[-1][1], slope, change * 100, verdict))
+    for panel in panels:
+        print(panel.report())
+    if baseline:
+        print('Top allocation growth since the end of the warmup:')
+        for stat in final.compare_to(baseline[0], 'lineno')[:args.top]:
+            print('  {}'.format(stat))
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == '__main__':
+    main()
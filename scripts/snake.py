@@ -29,10 +29,18 @@ import random
 import webbrowser
 from theme_settings import *
 import argparse
+from collections import deque, namedtuple
 
-import tinyproto
-from tlns.tlns import Board, PIXEL_MAX_BRIGHTNESS, PIXEL_HALF_BRIGHTNESS
-import serial
+from tlns.tlns import Board, PIXEL_HALF_BRIGHTNESS
+from tlns.link import add_sink_arguments, open_sink_from_args
+from tlns.profiling import timed, add_profile_arguments, profile_from_args
+from tlns.autopilot import Autopilot, ALGORITHMS, ALGORITHM_BFS
+from tlns.sprite import Sprite
+from tlns.monitor import add_monitor_arguments, monitor_from_args
+from tlns.metrics import add_metrics_arguments, metrics_from_args
+from logging import getLogger
+
+logger = getLogger(__name__)
 
 dpg.setup_registries()  # Registries for mouse and keyboard press events
 
@@ -66,19 +74,72 @@ BOARD_WIDTH = 21
 board = Board()
 serial_iface = None
 manual = False
+autopilot = None  # Autopilot steering the snake instead of the arrow keys
+monitor = None  # Live terminal view of the sent frames
+
+DIRECTION_MOVES = {1: (-1, 0), 2: (0, 1), 3: (1, 0), 4: (0, -1)}  # West, North, East, South
+MOVE_DIRECTIONS = dict((move, direction) for direction, move in DIRECTION_MOVES.items())
+AUTOPILOT_MAX_FILL = 0.5  # Start over once the snake covers this part of the burrow, apples need free 3x3 spots
+OPPOSITE_DIRECTIONS = dict((direction, MOVE_DIRECTIONS[(-dx, -dy)]) for direction, (dx, dy) in DIRECTION_MOVES.items())
+APPLE_SPRITE = Sprite.from_rows('###',
+                                '###',
+                                '###')
+
+KEY_SPACE = 32
+KEY_START = 69  # E
+KEY_RESTART = 81  # Q
+KEY_DIRECTIONS = {37: 1, 65: 1, 38: 2, 87: 2, 39: 3, 68: 3, 40: 4, 83: 4}  # Arrows and WASD
+INPUT_RESTART = 'restart'
+INPUT_RESET_STATS = 'reset_stats'
+INPUT_QUEUE_SIZE = 8
+PAUSE_POLL_INTERVAL = 0.05
+
+# The game state (slither_data, slither_change_data, apple_points, scores) is only changed by the game loop thread.
+# The dearpygui thread posts key codes and button presses to it through inputs: a deque with a single producer and a
+# single consumer needs no lock, append() and popleft() are atomic. When no game loop runs (manual mode, before Start,
+# after the snake died) the posting thread applies the inputs itself. handover_lock makes the hand over atomic: an
+# input is either posted to a running loop or applied by the posting thread, never left in the queue by a loop that
+# is just ending.
+inputs = deque()
+inputs_dropped = 0
+game_thread = None
+handover_lock = threading.Lock()
+
+# Immutable view of the game state published by the game loop after every change, for the rendering and the UART
+# and any other thread: snake and apple are tuples of (x, y), the head first
+Snapshot = namedtuple('Snapshot', 'snake apple score changes')
+snapshot = Snapshot((), (), 0, 0)
+
+
+def publish():
+    global snapshot
+    snapshot = Snapshot(tuple(tuple(point) for point in get_points_from_data(slither_data)),
+                        tuple(tuple(point) for point in apple_points), score_count, len(slither_change_data))
+
+
+def render_board(state: Snapshot) -> Board:
+    board_local = Board()
+    board_local.plot(state.snake[1:], PIXEL_HALF_BRIGHTNESS)  # The head is not drawn
+    if state.apple:
+        # apple starts with the top left corner of the apple
+        board_local.blit(APPLE_SPRITE, *state.apple[0])
+    return board_local
+
 
+def snake_points(state: Snapshot):
+    return [list(point) for point in state.snake]
 
+
+@timed
 def write_board_to_uart(board):
     global serial_iface
-    p = tinyproto.Hdlc()
-    p.begin()
-    p.put(board.tobytes(mirror_y=True))
-    print(str(board))
-    result = p.tx()
+    if monitor is not None:
+        monitor.show(board)
+    logger.debug('board:\n%s', board)
     if serial_iface is not None:
-        serial_iface.write(result)
+        serial_iface.send(board.tobytes(mirror_y=True))
     else:
-        print("serial_iface is None. Skip sending.")
+        logger.debug('serial_iface is None. Skip sending.')
 
 
 def initial_slither_points():
@@ -110,41 +171,82 @@ def restart_snake():
     initial_slither_points()
     place_apple()
 
-    body_points = get_points_from_data(slither_data)
-    body_points.pop(0)  # List of all points of the snake except the head
-    board_local = Board()
-    for body_point in body_points:
-        board_local.set_quietly(body_point[0], body_point[1], PIXEL_HALF_BRIGHTNESS)
-    for apple_point in apple_points:
-        board_local.set_quietly(apple_point[0], apple_point[1], PIXEL_MAX_BRIGHTNESS)
+    publish()
+    write_board_to_uart(render_board(snapshot))
+
+    dpg.configure_item(item=snake, points=snake_points(snapshot), color=dpg.get_value(item=snake_color))
 
-    write_board_to_uart(board_local)
 
-    dpg.configure_item(item=snake, points=get_points_from_data(slither_data), color=dpg.get_value(item=snake_color))
+def game_running() -> bool:
+    return game_thread is not None and game_thread.is_alive()
 
 
 def move_snakeDispatcher():
     # Function creates a new thread that controls the continuous movement of the snake while the main code is listening
-    # for any keyboard or mouse events to occur
-    move_snake_thread = threading.Thread(name="move snake", target=move_snake, args=(), daemon=True)
-    move_snake_thread.start()
+    # for any keyboard or mouse events to occur. It is the only thread changing the game state, so only one is started.
+    global game_thread
+    with handover_lock:
+        if game_running():
+            return
+        game_thread = threading.Thread(name="move snake", target=move_snake, args=(), daemon=True)
+        game_thread.start()
+
 
+def post_input(item):
+    """Called by the dearpygui thread with a key code or an INPUT_ command"""
+    global inputs_dropped
+    with handover_lock:
+        if len(inputs) >= INPUT_QUEUE_SIZE:
+            inputs_dropped += 1
+            logger.debug('Input queue full, %s dropped', item)
+            return
+        inputs.append(item)
+        if not game_running():
+            handle_inputs()
+
+
+def handle_inputs():
+    """Game loop side of the input queue. At most one turn is taken per step, the following ones wait for the next
+    steps: quick successive turns (e.g. a U-turn) are all made, one cell after the other."""
+    global pause
+    while inputs:
+        item = inputs.popleft()
+        if item == INPUT_RESTART:
+            restart_snake()
+        elif item == INPUT_RESET_STATS:
+            reset_stats()
+        elif item == KEY_SPACE:
+            if manual:
+                step()
+            else:
+                pause = not pause
+        elif item in KEY_DIRECTIONS and not pause and (snake_moving_flag or manual):
+            if turn(KEY_DIRECTIONS[item]) and not manual:
+                return
+
+
+def turn(direction) -> bool:
+    """Records the direction change on the cell ahead of the head, unless it keeps or reverses the head direction"""
+    head_point, head_direction = slither_data[0]
+    if direction in (head_direction, OPPOSITE_DIRECTIONS[head_direction]):
+        return False
+    dx, dy = DIRECTION_MOVES[head_direction]
+    slither_change_data.append([[head_point[0] + dx, head_point[1] + dy], direction])
+    publish()
+    return True
+
+@timed
 def step():
     global slither_data, slither_change_data, snake, snake_moving_flag, apple_points, snake_speed, snake_color, \
         snake_length_flag, score, score_count, highest_score, highest_score_count, manual
     if pause:
+        time.sleep(PAUSE_POLL_INTERVAL)
         return 0
     snake_moving_flag = 1
     body_points = get_points_from_data(slither_data)
     body_points.pop(0)  # List of all points of the snake except the head
 
-    board_local = Board()
-    for body_point in body_points:
-        board_local.set_quietly(body_point[0], body_point[1], PIXEL_HALF_BRIGHTNESS)
-    for apple_point in apple_points:
-        board_local.set_quietly(apple_point[0], apple_point[1], PIXEL_MAX_BRIGHTNESS)
-
-    write_board_to_uart(board_local)
+    write_board_to_uart(render_board(snapshot))
 
     if slither_data[0][0][1] == BOARD_WIDTH or slither_data[0][0][0] == BOARD_HEIGHT or \
             slither_data[0][0][1] == 0 or slither_data[0][0][0] == 0 or \
@@ -224,22 +326,53 @@ def step():
                 # of that point gets updated
                 slither_data[index][1] = get_direction_from_data(slither_data[index][0], slither_change_data)
 
-        for index in range(len(slither_change_data)):
-            if not slither_change_data[index][0] in get_points_from_data(slither_data):
-                slither_change_data.pop(index)
-                break
+        # Changes no segment is on anymore have been passed by the whole snake
+        slither_points = get_points_from_data(slither_data)
+        slither_change_data = [change for change in slither_change_data if change[0] in slither_points]
 
-    dpg.configure_item(item=snake, points=get_points_from_data(slither_data))
+    publish()
+    dpg.configure_item(item=snake, points=snake_points(snapshot))
 
     time_pause = (-0.1*dpg.get_value(item=snake_speed)) + 1.1
     time.sleep(time_pause)  # Sets the speed of the snake depending on the value
 
     return 0
 
+def autopilot_steer():
+    global slither_change_data
+    if len(slither_data) >= AUTOPILOT_MAX_FILL * autopilot.w * autopilot.h:
+        logger.info(autopilot.report())
+        restart_snake()
+
+    # A direction change takes effect one cell ahead of the head (see key_release_handler), plan from there.
+    # Cells staying occupied during that move: the snake without its last two segments.
+    head_point, head_direction = slither_data[0]
+    dx, dy = DIRECTION_MOVES[head_direction]
+    next_point = [head_point[0] + dx, head_point[1] + dy]
+    move = autopilot.plan(next_point, get_points_from_data(slither_data[:-2]), apple_points)
+    if move is None:
+        return
+    # The head is the next segment to reach next_point, a stale change left there must not apply to it
+    slither_change_data = [change for change in slither_change_data if change[0] != next_point]
+    slither_change_data.append([next_point, MOVE_DIRECTIONS[move]])
+
+
 def move_snake():
+    global game_thread
+    publish()
     while not manual:
+        handle_inputs()
+        if autopilot is not None:
+            autopilot_steer()
         if step() < 0:
-            break
+            if autopilot is None:
+                break
+            logger.info(autopilot.report())
+            restart_snake()
+    # Inputs posted during the last step are applied here, the following ones by the posting thread
+    with handover_lock:
+        game_thread = None
+        handle_inputs()
 
 def get_points_from_data(data):
     # Functions takes entire data of slither and returns only the points
@@ -338,72 +471,21 @@ def open_help():
 
 
 def key_release_handler(sender, app_data):
-    global snake_moving_flag, pause
-    # Function listening to key release events. Arrow keys change snake direction and keeps a track of the point when
-    # the key event occurs
-
-    if app_data == 81:
-        # TODO
-        restart_snake()
-
-    if not manual and app_data == 32:
-        pause = False if pause else True
-
-    if pause:
+    # Function listening to key release events on the dearpygui thread. Arrow keys (or WASD) change snake direction,
+    # Space pauses (steps in manual mode), E starts and Q restarts. Apart from starting the game loop it only posts
+    # the key to the game loop, see handle_inputs()
+    if app_data == KEY_START and not manual and not game_running():
+        move_snakeDispatcher()
         return
+    post_input(INPUT_RESTART if app_data == KEY_RESTART else app_data)
 
-    if snake_moving_flag == 0:  # If snake not moving then exit
-        if app_data == 69:
-            move_snakeDispatcher()
-        if not manual:
-            return
-
-    global slither_data, slither_change_data
-    head_point = slither_data[0][0][:]
-    head_direction = slither_data[0][1]
 
-    if head_direction == 1:
-        # West
-        head_point[0] -= 1
+def restart_pressed():
+    post_input(INPUT_RESTART)
 
-    if head_direction == 2:
-        # North
-        head_point[1] += 1
 
-    if head_direction == 3:
-        # East
-        head_point[0] += 1
-
-    if head_direction == 4:
-        # South
-        head_point[1] -= 1
-
-    if app_data == 37 or app_data == 65:
-        # West
-        if head_direction != 3 and head_direction != 1:
-            snake_direction = 1
-            slither_change_data.append([head_point, snake_direction])
-
-    if app_data == 38 or app_data == 87:
-        # North
-        if head_direction != 4 and head_direction != 2:
-            snake_direction = 2
-            slither_change_data.append([head_point, snake_direction])
-
-    if app_data == 39 or app_data == 68:
-        # East
-        if head_direction != 1 and head_direction != 3:
-            snake_direction = 3
-            slither_change_data.append([head_point, snake_direction])
-
-    if app_data == 40 or app_data == 83:
-        # South
-        if head_direction != 2 and head_direction != 4:
-            snake_direction = 4
-            slither_change_data.append([head_point, snake_direction])
-
-    if manual and app_data == 32:
-        step()
+def reset_stats_pressed():
+    post_input(INPUT_RESET_STATS)
 
 
 def main_window_setup():
@@ -477,8 +559,8 @@ def main_window_setup():
                     dpg.add_separator()
                     dpg.add_dummy()
                     dpg.add_button(label="Start", callback=move_snakeDispatcher, width=-1, height=30)
-                    dpg.add_button(label="Restart", callback=restart_snake, width=-1, height=30)
-                    dpg.add_button(label="Reset Stats", width=-1, height=30, callback=reset_stats)
+                    dpg.add_button(label="Restart", callback=restart_pressed, width=-1, height=30)
+                    dpg.add_button(label="Reset Stats", width=-1, height=30, callback=reset_stats_pressed)
                     dpg.add_dummy()
                     dpg.add_separator()
                     dpg.add_dummy()
@@ -488,6 +570,9 @@ def main_window_setup():
 
     place_apple()
 
+    if autopilot is not None:
+        move_snakeDispatcher()
+
     dpg.set_primary_window(window=main_window, value=True)
     dpg.start_dearpygui()
 
@@ -496,23 +581,44 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(fromfile_prefix_chars='@', description='')
     parser.add_argument('-d', '--device', help='Serial device path', dest='device', type=str, default='/dev/ttyUSB0')
     parser.add_argument('-m', '--manual', help='Stem on Space', dest='manual', type=bool, default=False)
+    parser.add_argument('--mirror', help='Additional serial device showing the same frames (repeatable)',
+                        dest='mirrors', action='append', default=[])
+    parser.add_argument('--autopilot', help='Let the snake play by itself (path search algorithm)', dest='autopilot',
+                        nargs='?', const=ALGORITHM_BFS, choices=ALGORITHMS)
+    add_sink_arguments(parser)
+    add_profile_arguments(parser)
+    add_monitor_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    monitor = monitor_from_args(args)
 
     manual = args.manual
+    if args.autopilot:
+        # The head dies on the border cells, the burrow is what is inside of them
+        autopilot = Autopilot(1, 1, BOARD_HEIGHT - 1, BOARD_WIDTH - 1, args.autopilot)
+        logger.info('Autopilot ON: %s', args.autopilot)
 
     if manual:
         snake_moving_flag = 1
-        print("Manual mode ON")
+        logger.info('Manual mode ON')
     else:
-        print("Manual mode OFF")
+        logger.info('Manual mode OFF')
 
     try:
-        serial_iface = serial.Serial(args.device, baudrate=115200, bytesize=8, parity='N', stopbits=1, timeout=None)
-        print("Serial device opened!")
+        serial_iface = metrics_from_args(args, open_sink_from_args([args.device] + args.mirrors, args))
+        logger.info('Serial device opened!')
     except Exception as e:
-        print("No Serial Device. Run without it.")
-        print("e: " + str(e))
+        logger.warning('No Serial Device. Run without it.')
+        logger.warning('e: %s', e)
 
     initial_slither_points()
-    main_window_setup()
+    with profile_from_args(args):
+        main_window_setup()
+
+    if monitor is not None:
+        monitor.stop()
+        print(monitor.report())
+    if serial_iface is not None:
+        serial_iface.close()
+        print(serial_iface.report())
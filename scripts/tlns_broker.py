@@ -0,0 +1,38 @@
+import asyncio
+import argparse
+import logging
+
+from tlns.link import open_sink
+from tlns.broker import FrameBroker, DEFAULT_ADDRESS, POLICIES, POLICY_PRIORITY
+
+
+def main():
+    parser = argparse.ArgumentParser(fromfile_prefix_chars='@', description='Owns the panel serial link and '
+                                     'forwards frames published by tlns_gui.py, snake.py, tlns_serial_testing.py')
+    parser.add_argument('-d', '--device', help='Serial device path', dest='device', type=str, default='/dev/ttyUSB0')
+    parser.add_argument('-m', '--mirror', help='Additional serial device showing the same frames (repeatable)',
+                        dest='mirrors', action='append', default=[])
+    parser.add_argument('-B', '--baud', help='Serial device baudrate', dest='baud', type=int, default=115200)
+    parser.add_argument('-l', '--listen', help='Unix socket path or host:port to accept producers on',
+                        dest='listen', type=str, default=DEFAULT_ADDRESS)
+    parser.add_argument('--policy', help='Source arbitration policy', dest='policy', choices=POLICIES,
+                        default=POLICY_PRIORITY)
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    sink = open_sink([args.device] + args.mirrors, args.baud)
+    broker = FrameBroker(sink, args.baud, args.policy)
+    try:
+        asyncio.run(broker.serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        print(broker.report())
+        print(sink.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import time
+import argparse
+
+from tlns.emulator import VirtualPanel, PROTOCOLS, PROTOCOL_HDLC
+from tlns.bus import parse_addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(fromfile_prefix_chars='@', description='Pty backed virtual panel, '
+                                     'pass the printed device to the other scripts with -d')
+    parser.add_argument('-r', '--rate', help='Frames per second the panel takes from its buffer (and acks)',
+                        dest='rate', type=float, default=None)
+    parser.add_argument('--flow-control', help='Expect seq prefixed frames and ack them', dest='flow_control',
+                        action='store_true')
+    parser.add_argument('--buffer', help='Panel frame buffer size', dest='buffer', type=int,
+                        default=VirtualPanel.BUFFER_SIZE)
+    parser.add_argument('--protocol', help='Link protocol', dest='protocol', choices=PROTOCOLS,
+                        default=PROTOCOL_HDLC)
+    parser.add_argument('--error-rate', help='Probability of a bit flip per byte', dest='error_rate', type=float,
+                        default=0.0)
+    parser.add_argument('-B', '--baud', help='Emulated line baudrate', dest='baud', type=int, default=None)
+    parser.add_argument('-a', '--addresses', help='Host addressed panels on a bus line, e.g. 1,2,5-7',
+                        dest='addresses', type=parse_addresses, default=None)
+    parser.add_argument('-v', '--verbose', help='Print every shown frame', dest='verbose', action='store_true')
+
+    args = parser.parse_args()
+
+    with VirtualPanel(args.rate, args.flow_control, args.buffer, protocol=args.protocol, error_rate=args.error_rate,
+                      baudrate=args.baud, addresses=args.addresses) as panel:
+        print("Virtual panel: " + panel.device)
+        shown = 0
+        try:
+            while True:
+                time.sleep(1)
+                if args.verbose and panel.frames_shown != shown:
+                    shown = panel.frames_shown
+                    print(panel.board())
+                print(panel.report())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
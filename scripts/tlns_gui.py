@@ -6,17 +6,28 @@ from asyncqt import QEventLoop
 import qtawesome
 import sys
 from itertools import count
-import tinyproto
 from tlns.tlns import Board, PIXEL_MAX_BRIGHTNESS
-import serial
 import argparse
 
 from PyQt5.QtWidgets import QVBoxLayout, QPushButton, QMessageBox, \
     QComboBox, QDialog, QLabel
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFontInfo, QFont, QPen, QBrush
+from contextlib import contextmanager
+from functools import lru_cache
+from collections import OrderedDict
 
 from tlns.tlns import *
+from tlns.trail import Trail
+from tlns.grid import CellSet, CellMap
+from tlns.link import add_sink_arguments, open_sink_from_args
+from tlns.profiling import timed, add_profile_arguments, profile_from_args
+from tlns.inputlog import InputRecorder
+from tlns.monitor import Monitor, add_monitor_arguments, monitor_from_args
+from tlns.metrics import add_metrics_arguments, metrics_from_args
+from logging import getLogger
+
+logger = getLogger(__name__)
 
 WINDOW_MUL_COEF = 40
 
@@ -26,6 +37,14 @@ WINDOW_HEIGHT = Board.HEIGHT * WINDOW_MUL_COEF
 BRIGHTNESS_ARROW = 0x01
 BRIGHTNESS_TARGET = PIXEL_MAX_BRIGHTNESS
 
+GRID_COLOR = QtGui.QColor(40, 40, 40)
+
+# Once the trail is full its oldest points are erased from the window every capacity / TRAIL_TRIM_FRACTION moves
+TRAIL_TRIM_FRACTION = 16
+
+COVERAGE_BRIGHTNESS = PIXEL_HALF_BRIGHTNESS  # Board value of a fully covered cell
+COVERAGE_STROKE_WIDTH = WINDOW_MUL_COEF // 2
+
 def get_monospace_font():
     preferred = ['Consolas', 'DejaVu Sans Mono', 'Monospace', 'Lucida Console', 'Monaco']
     for name in preferred:
@@ -178,6 +197,16 @@ def get_random_target_pos(current_pos_x:int = None, current_pos_y:int = None) ->
     return get_x(w), get_y(h)
 
 
+def get_cell(point: Point) -> (int, int):
+    return point.x // WINDOW_MUL_COEF, point.y // WINDOW_MUL_COEF
+
+
+@lru_cache(maxsize=Board.WIDTH * Board.HEIGHT)
+def get_hit_bounds(target_x: int, target_y: int) -> (float, float, float, float):
+    half = WINDOW_MUL_COEF/2 + WINDOW_MUL_COEF
+    return target_x - half, target_y - half, target_x + half, target_y + half
+
+
 def get_random_target_point(point_: Point = None) -> Point:
     if point_:
         point = point_
@@ -186,27 +215,130 @@ def get_random_target_point(point_: Point = None) -> Point:
     return Point(*get_random_target_pos(*point))
 
 
+class LayeredCanvas(QtWidgets.QWidget):
+    """Retained-mode drawing surface.
+    Every layer is a cached transparent pixmap which is only painted with the delta of an event,
+    the layers are composited (bottom to top, in LAYERS order) once per screen refresh in paintEvent()."""
+    LAYERS = ('grid', 'path', 'line', 'shots', 'target')
+
+    def __init__(self, width, height, parent=None):
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self._layers = OrderedDict()
+        for name in self.LAYERS:
+            layer = QtGui.QPixmap(width, height)
+            layer.fill(Qt.transparent)
+            self._layers[name] = layer
+        self._draw_grid()
+
+    def _draw_grid(self):
+        grid = self._layers['grid']
+        grid.fill(Qt.black)
+        with self.paint('grid') as painter:
+            painter.setPen(QPen(GRID_COLOR, 1, Qt.SolidLine))
+            for x in range(0, grid.width(), WINDOW_MUL_COEF):
+                painter.drawLine(x, 0, x, grid.height())
+            for y in range(0, grid.height(), WINDOW_MUL_COEF):
+                painter.drawLine(0, y, grid.width(), y)
+
+    @contextmanager
+    def paint(self, name):
+        painter = QtGui.QPainter(self._layers[name])
+        try:
+            yield painter
+        finally:
+            painter.end()
+
+    def clear(self, *names):
+        for name in names if names else self.LAYERS[1:]:
+            self._layers[name].fill(Qt.transparent)
+        self.update()
+
+    def paintEvent(self, e: QtGui.QPaintEvent) -> None:
+        rect = e.rect()
+        painter = QtGui.QPainter(self)
+        for layer in self._layers.values():
+            painter.drawPixmap(rect, layer, rect)
+        painter.end()
+
+
+class CoverageLayer:
+    """Offscreen grayscale image of the mouse strokes, the board brightness of a cell is the part of its
+    WINDOW_MUL_COEF square the strokes cover. The image buffer is read through a numpy view (no copy), only the
+    cells under the bounding box of the latest segment are averaged, so the work follows the changed area."""
+
+    def __init__(self, width, height):
+        import numpy as np
+
+        self._np = np
+        self.image = QtGui.QImage(width, height, QtGui.QImage.Format_Grayscale8)
+        self.image.fill(0)
+        bits = self.image.bits()
+        bits.setsize(self.image.byteCount())
+        # Rows may be padded, the view is [y, x] over the visible part
+        self.pixels = np.frombuffer(bits, np.uint8).reshape(height, self.image.bytesPerLine())[:, :width]
+        self.prev = None
+
+    def clear(self):
+        self.image.fill(0)
+        self.prev = None
+
+    def stroke(self, point: Point) -> (int, int, int, int):
+        """Draws the segment from the previous point, returns the cell range x0, y0, x1, y1 (exclusive) it touches"""
+        prev = self.prev or point
+        self.prev = point
+        painter = QtGui.QPainter(self.image)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(QPen(Qt.white, COVERAGE_STROKE_WIDTH, Qt.SolidLine, Qt.RoundCap))
+        painter.drawLine(prev.x, prev.y, point.x, point.y)
+        painter.end()
+        margin = COVERAGE_STROKE_WIDTH // 2 + 1
+        x0 = max(min(prev.x, point.x) - margin, 0) // WINDOW_MUL_COEF
+        y0 = max(min(prev.y, point.y) - margin, 0) // WINDOW_MUL_COEF
+        x1 = min(-(-(max(prev.x, point.x) + margin) // WINDOW_MUL_COEF), Board.WIDTH)
+        y1 = min(-(-(max(prev.y, point.y) + margin) // WINDOW_MUL_COEF), Board.HEIGHT)
+        return x0, y0, x1, y1
+
+    def apply(self, board: Board, x0, y0, x1, y1) -> bool:
+        """Raises the board cells of the range to their coverage, returns whether any of them changed"""
+        np = self._np
+        c = WINDOW_MUL_COEF
+        if x0 >= x1 or y0 >= y1:
+            return False
+        block = self.pixels[y0 * c:y1 * c, x0 * c:x1 * c].reshape(y1 - y0, c, x1 - x0, c)
+        levels = (block.sum(axis=(1, 3), dtype=np.uint32) * COVERAGE_BRIGHTNESS // (0xFF * c * c)).astype(np.uint8)
+        cells = board.array()[x0:x1, y0:y1]
+        raised = np.maximum(cells, levels.T)
+        if np.array_equal(raised, cells):
+            return False
+        cells[...] = raised
+        return True
+
+
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, iface, no_path: bool = False, no_target: bool = False):
+    def __init__(self, sink, no_path: bool = False, no_target: bool = False,
+                 trail_length: int = Trail.DEFAULT_CAPACITY, trail_min_distance: int = Trail.DEFAULT_MIN_DISTANCE,
+                 recorder: InputRecorder = None, monitor: Monitor = None, coverage: bool = False):
         super().__init__()
 
         self.no_path = no_path
         self.no_target = no_target
-        self.label = QtWidgets.QLabel()
-        canvas = QtGui.QPixmap(WINDOW_WIDTH, WINDOW_HEIGHT)
-        self.label.setPixmap(canvas)
-        self.setCentralWidget(self.label)
+        self.recorder = recorder
+        self.monitor = monitor
+        self.coverage = CoverageLayer(WINDOW_WIDTH, WINDOW_HEIGHT) if coverage else None
+        self.canvas = LayeredCanvas(WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.setCentralWidget(self.canvas)
         self.setMouseTracking(True)
         self.centralWidget().setMouseTracking(True)
         self.target_pos = get_random_target_point()
         self.draw_target()
-        self.line = []
-        self.path_rects = []
-        self.shots = []
+        self.line = Trail(trail_length, trail_min_distance)
+        self.path_rects = CellSet()
+        self.shots = CellMap()
+        self.current_cell = None
         self.board = Board()
-        self.p = tinyproto.Hdlc()
-        self.p.begin()
-        self.ser = serial.Serial(iface, baudrate=115200, bytesize=8, parity='N', stopbits=1, timeout=None)
+        self.sink = sink
         self.update_board_target(None, self.target_pos)
         self.write_board_to_uart()
         self.prev_pos = None
@@ -214,131 +346,70 @@ class MainWindow(QtWidgets.QMainWindow):
     def draw_target(self, color=Qt.white, point:Point=None):
         if self.no_target:
             return
-        print("target_pos: ", str(self.target_pos.x) + ", " + str(self.target_pos.y))
+        logger.debug('target_pos: %s, %s', self.target_pos.x, self.target_pos.y)
         if not point:
             point = self.target_pos
-        points = list()
-        points.append(point)
-        points.append(Point(point.x - WINDOW_MUL_COEF, point.y))
-        points.append(Point(point.x - WINDOW_MUL_COEF, point.y - WINDOW_MUL_COEF))
-        points.append(Point(point.x - WINDOW_MUL_COEF, point.y + WINDOW_MUL_COEF))
-        points.append(Point(point.x + WINDOW_MUL_COEF, point.y - WINDOW_MUL_COEF))
-        points.append(Point(point.x + WINDOW_MUL_COEF, point.y))
-        points.append(Point(point.x + WINDOW_MUL_COEF, point.y + WINDOW_MUL_COEF))
-        points.append(Point(point.x + WINDOW_MUL_COEF, point.y + WINDOW_MUL_COEF))
-        points.append(Point(point.x, point.y + WINDOW_MUL_COEF))
-        points.append(Point(point.x, point.y - WINDOW_MUL_COEF))
-        painter = QtGui.QPainter(self.label.pixmap())
-        pen = QtGui.QPen()
-        pen.setWidth(WINDOW_MUL_COEF)
-        pen.setColor(color)
-        painter.setPen(pen)
-        for point_ in points:
-            painter.drawPoint(*point_)
-        painter.end()
-
-    def redraw_path_rects(self):
-        for point in self.path_rects:
-            self.draw_path_rect(point)
-
+        self.canvas.clear('target')
+        with self.canvas.paint('target') as painter:
+            pen = QtGui.QPen()
+            pen.setWidth(WINDOW_MUL_COEF)
+            pen.setColor(color)
+            painter.setPen(pen)
+            painter.drawPoints(QtGui.QPolygon(STENCIL_TARGET.points(point.x, point.y, WINDOW_MUL_COEF)))
+
+    def paint_path_rect(self, rect_pos:Point, color=Qt.gray):
+        with self.canvas.paint('path') as painter:
+            painter.setPen(QPen(Qt.magenta, 2, Qt.SolidLine))
+            painter.setBrush(QBrush(color, Qt.SolidPattern))
+            painter.drawRect(rect_pos.x, rect_pos.y, WINDOW_MUL_COEF, WINDOW_MUL_COEF)
+        self.canvas.update(rect_pos.x - 1, rect_pos.y - 1, WINDOW_MUL_COEF + 2, WINDOW_MUL_COEF + 2)
+
+    @timed
     def draw_path_rect(self, point:Point, color=Qt.gray):
         if self.hit(point):
             return
 
         rect_pos = Board.get_pos(point, WINDOW_MUL_COEF)
+        x_rect, y_rect = get_cell(rect_pos)
 
-        if self.no_path and self.prev_pos:
-            x_prev = int(self.prev_pos.x / WINDOW_MUL_COEF)
-            y_prev = int(self.prev_pos.y / WINDOW_MUL_COEF)
-            x_rect = int(rect_pos.x / WINDOW_MUL_COEF)
-            y_rect = int(rect_pos.y / WINDOW_MUL_COEF)
+        if self.no_path and self.prev_pos and not self.coverage:
+            x_prev, y_prev = get_cell(self.prev_pos)
             if x_prev != x_rect or y_prev != y_rect:
                 self.board.unset(x_prev, y_prev)
                 self.board.set(x_rect, y_rect, BRIGHTNESS_ARROW)
                 self.prev_pos = rect_pos
                 self.write_board_to_uart()
 
-        if rect_pos in self.path_rects:
+        if not self.path_rects.add(x_rect, y_rect):
             return
 
-        print("rect_pos: ", str(rect_pos))
-
-        painter = QtGui.QPainter(self.label.pixmap())
-        painter.setPen(QPen(Qt.magenta, 2, Qt.SolidLine))
-        painter.setBrush(QBrush(color, Qt.SolidPattern))
-        painter.drawRect(rect_pos.x, rect_pos.y, WINDOW_MUL_COEF, WINDOW_MUL_COEF)
-
-        if False and self.path_rects:
-            painter.setPen(QPen(color, 2, Qt.SolidLine))
-            if self.path_rects[-1].x == rect_pos.x:
-                x = rect_pos.x + 2
-                if rect_pos.y > self.path_rects[-1].y:
-                    y = rect_pos.y - 2
-                else:
-                    y = self.path_rects[-1].y - 2
-                painter.drawRect(x, y, WINDOW_MUL_COEF-4, 4)
-            if self.path_rects[-1].y == rect_pos.y:
-                y = rect_pos.y + 2
-                if rect_pos.x > self.path_rects[-1].x:
-                    x = rect_pos.x - 2
-                else:
-                    x = self.path_rects[-1].x - 2
-                    print("rect_pos.x < self.path_rects[-1].x")
-                painter.drawRect(x, y, 4, WINDOW_MUL_COEF-4)
+        logger.debug('rect_pos: %s', rect_pos)
 
-        painter.end()
+        self.paint_path_rect(rect_pos, color)
 
-        self.redraw_line()
-        self.redraw_shots()
-        self.draw_target()
-        if rect_pos not in self.path_rects:
-            #for old_rect in self.path_rects:
-            #    self.board.set(int(old_rect.x/WINDOW_MUL_COEF), int(old_rect.y/WINDOW_MUL_COEF), 0)
-            if not self.no_path:
-                self.board.set(int(rect_pos.x/WINDOW_MUL_COEF), int(rect_pos.y/WINDOW_MUL_COEF), BRIGHTNESS_ARROW)
-                self.write_board_to_uart()
-            self.path_rects.append(rect_pos)
-            self.prev_pos = rect_pos
+        if not self.no_path and not self.coverage:
+            self.board.set(x_rect, y_rect, BRIGHTNESS_ARROW)
+            self.write_board_to_uart()
+        self.prev_pos = rect_pos
 
         if not self.no_target:
             self.board.set(int(self.target_pos.x/WINDOW_MUL_COEF), int(self.target_pos.y/WINDOW_MUL_COEF), BRIGHTNESS_TARGET)
 
+    @timed
     def write_board_to_uart(self):
-        self.p.put(self.board.__bytes__())
-        print(str(self.board))
-        result = self.p.tx()
-        self.ser.write(result)
-
-    def redraw_path(self):
-        self.redraw_path_rects()
-        self.redraw_line()
-        self.redraw_shots()
+        self.sink.send(self.board.__bytes__())
+        if self.monitor:
+            self.monitor.show(self.board)
+        logger.debug('board:\n%s', self.board)
 
     def hit(self, point:Point, target_pos:Point=None) -> bool:
         compare_pos = target_pos if target_pos else self.target_pos
-        hit_x = (compare_pos.x - WINDOW_MUL_COEF/2) - WINDOW_MUL_COEF < point.x < (compare_pos.x + WINDOW_MUL_COEF/2) + WINDOW_MUL_COEF
-        hit_y = (compare_pos.y - WINDOW_MUL_COEF/2) - WINDOW_MUL_COEF < point.y < (compare_pos.y + WINDOW_MUL_COEF/2) + WINDOW_MUL_COEF
-        return hit_x and hit_y
+        x_min, y_min, x_max, y_max = get_hit_bounds(compare_pos.x, compare_pos.y)
+        return x_min < point.x < x_max and y_min < point.y < y_max
 
     def update_board_target(self, old_pos, new_pos):
         def big_point(point, val):
-            self.board.set(int(point.x / WINDOW_MUL_COEF), int(point.y / WINDOW_MUL_COEF), val)
-#            return
-            x = int(point.x / WINDOW_MUL_COEF)
-            y = int(point.y / WINDOW_MUL_COEF)
-            if y > 0:
-                self.board.set_quietly(x, y - 1, val)
-            self.board.set_quietly(x, y + 1, val)
-            if x > 0 and y > 1:
-                self.board.set_quietly(x - 1, y - 1, val)
-            if x > 0:
-                self.board.set_quietly(x - 1, y + 1, val)
-            if y > 0:
-                self.board.set_quietly(x + 1, y - 1, val)
-            self.board.set_quietly(x + 1, y + 1, val)
-            if x > 0:
-                self.board.set_quietly(x - 1, y, val)
-            self.board.set_quietly(x + 1, y, val)
+            self.board.stamp(STENCIL_TARGET, int(point.x / WINDOW_MUL_COEF), int(point.y / WINDOW_MUL_COEF), val)
         if self.no_target:
             return
         if old_pos:
@@ -346,74 +417,90 @@ class MainWindow(QtWidgets.QMainWindow):
         big_point(new_pos, BRIGHTNESS_TARGET)
 
     def redraw_target(self):
-        old_pos = copy.copy(self.target_pos)
+        old_pos = self.target_pos
         self.board.set(int(self.target_pos.x/WINDOW_MUL_COEF), int(self.target_pos.y/WINDOW_MUL_COEF), 0)
-        self.draw_target(Qt.black)
         self.target_pos = get_random_target_point(self.target_pos)
         self.draw_target()
         self.update_board_target(old_pos, self.target_pos)
 
-    def redraw_shots(self):
-        for point, target_pos in self.shots:
-            self.draw_shot(point, target_pos)
-
     def draw_shot(self, point:Point, target_pos:Point=None):
-        painter = QtGui.QPainter(self.label.pixmap())
-        painter.setPen(QPen(Qt.green, 2, Qt.SolidLine))
-        color = Qt.red if self.hit(point, target_pos) else Qt.white
-        painter.setBrush(QBrush(color, Qt.SolidPattern))
-        painter.drawEllipse(point.x - 7, point.y - 7, 14, 14)
-
-    def draw_point(self, point:Point):
-        painter = QtGui.QPainter(self.label.pixmap())
+        with self.canvas.paint('shots') as painter:
+            painter.setPen(QPen(Qt.green, 2, Qt.SolidLine))
+            color = Qt.red if self.hit(point, target_pos) else Qt.white
+            painter.setBrush(QBrush(color, Qt.SolidPattern))
+            painter.drawEllipse(point.x - 7, point.y - 7, 14, 14)
+        self.canvas.update(point.x - 8, point.y - 8, 16, 16)
+
+    @staticmethod
+    def line_pen():
         pen = QtGui.QPen()
         pen.setWidth(2)
         pen.setColor(Qt.cyan)
-        painter.setPen(pen)
-        painter.drawPoint(*point)
-        painter.end()
+        return pen
+
+    def draw_point(self, point:Point):
+        with self.canvas.paint('line') as painter:
+            painter.setPen(self.line_pen())
+            painter.drawPoint(*point)
+        self.canvas.update(point.x - 2, point.y - 2, 4, 4)
 
     def redraw_line(self):
-        for point in self.line:
-            self.draw_point(point)
+        self.canvas.clear('line')
+        with self.canvas.paint('line') as painter:
+            painter.setPen(self.line_pen())
+            painter.drawPoints(QtGui.QPolygon(self.line.tolist()))
+
+    def trim_line(self):
+        # Repaints the points the trail retains in one batch, the ones it has overwritten disappear
+        self.line.overwritten = 0
+        self.redraw_line()
 
     def clear_all(self):
-        painter = QtGui.QPainter(self.label.pixmap())
-        painter.setBrush(QBrush(Qt.black, Qt.SolidPattern))
-        painter.drawRect(0, 0, self.label.pixmap().width(), self.label.pixmap().height())
-        self.line = []
-        self.path_rects = []
-        self.shots = []
+        self.canvas.clear()
+        self.line.clear()
+        self.path_rects.clear()
+        self.shots.clear()
+        self.current_cell = None
+        if self.coverage:
+            self.coverage.clear()
         self.board = Board()
         self.write_board_to_uart()
 
     def mouseMoveEvent(self, e):
+        if self.recorder:
+            self.recorder.move(e.x(), e.y())
         point = Point(e.x(), e.y())
-        self.draw_point(point)
+        if self.line.append(point.x, point.y):
+            self.draw_point(point)
+            if self.line.overwritten >= max(self.line.capacity // TRAIL_TRIM_FRACTION, 1):
+                self.trim_line()
+        if self.coverage and self.coverage.apply(self.board, *self.coverage.stroke(point)):
+            self.write_board_to_uart()
+
+        # Everything below only depends on the board cell under the cursor
+        cell = get_cell(point)
+        if cell == self.current_cell or not self.path_rects.in_bounds(*cell):
+            return
+        self.current_cell = cell
         self.draw_path_rect(point)
 
-        self.line.append(point)
-
-        self.update()
-
     def mousePressEvent(self, e: QtGui.QMouseEvent) -> None:
+        if self.recorder:
+            self.recorder.press(e.x(), e.y(), int(e.buttons()))
         if e.buttons() == QtCore.Qt.LeftButton:
             old_target_pos = self.target_pos
             point = Point(e.x(), e.y())
-            self.shots.append((point, old_target_pos))
-            print("target: " + str(self.target_pos) + ", mouse: " + str(point))
+            self.shots.add(*get_cell(point), (point, old_target_pos))
+            logger.debug('target: %s, mouse: %s', self.target_pos, point)
             if self.hit(point):
-                self.path_rects = []
                 self.clear_all()
-                self.redraw_line()
                 self.redraw_target()
                 self.write_board_to_uart()
             else:
-                self.redraw_path()
+                self.draw_shot(point, old_target_pos)
         elif e.buttons() == QtCore.Qt.RightButton:
             self.clear_all()
             self.draw_target(point=self.target_pos)
-        self.update()
 
 
 def main():
@@ -421,8 +508,23 @@ def main():
     parser.add_argument('-d', '--device', help='Serial device path', dest='device', type=str, default='-')
     parser.add_argument('--no-path', help='No path on device', dest='no_path', type=bool, default=False)
     parser.add_argument('--no-target', help='No target', dest='no_target', type=bool, default=False)
+    parser.add_argument('-m', '--mirror', help='Additional serial device showing the same frames (repeatable)',
+                        dest='mirrors', action='append', default=[])
+    add_sink_arguments(parser)
+    parser.add_argument('--trail-length', help='Max number of retained mouse trail points', dest='trail_length',
+                        type=int, default=Trail.DEFAULT_CAPACITY)
+    parser.add_argument('--trail-min-distance', help='Drop trail points closer than this (px)',
+                        dest='trail_min_distance', type=int, default=Trail.DEFAULT_MIN_DISTANCE)
+    parser.add_argument('--record', help='Write the mouse input to a file, see benchmarks/gui_replay.py',
+                        dest='record', type=str, default=None)
+    parser.add_argument('--coverage', help='Antialiased board: cell brightness from the stroke coverage of its '
+                        'square instead of the cell under the cursor', dest='coverage', action='store_true')
+    add_profile_arguments(parser)
+    add_monitor_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    monitor = monitor_from_args(args)
 
     app = QApplication(sys.argv)
     loop = QEventLoop(app)
@@ -433,7 +535,9 @@ def main():
 
     asyncio.set_event_loop(loop)  # NEW must set the event loop
 
-    if args.device == '-':
+    if args.broker:
+        iface = args.broker
+    elif args.device == '-':
         while True:
             # Asking the user to specify which interface to work with
             try:
@@ -448,10 +552,27 @@ def main():
     else:
         iface = args.device
 
-    print("iface: " + iface)
-    window = MainWindow(iface, args.no_path, args.no_target)
+    logger.info('iface: %s', iface)
+    sink = metrics_from_args(args, open_sink_from_args([iface] + args.mirrors, args))
+    recorder = InputRecorder(args.record) if args.record else None
+    window = MainWindow(sink, args.no_path, args.no_target, args.trail_length, args.trail_min_distance, recorder,
+                        monitor, args.coverage)
     window.show()
-    app.exec_()
+    with profile_from_args(args) as session:
+        if session:
+            # Python signal handlers only run when the interpreter gets control from the Qt loop
+            signal_timer = QTimer()
+            signal_timer.timeout.connect(lambda: None)
+            signal_timer.start(200)
+        app.exec_()
+    sink.close()
+    if monitor:
+        monitor.stop()
+        print(monitor.report())
+    print(sink.report())
+    if recorder:
+        recorder.close()
+        print('recorded {} events to {}'.format(recorder.events, args.record))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,53 @@
+import argparse
+import itertools
+
+from tlns.link import add_sink_arguments, open_sink_from_args
+from tlns.playback import open_frames, play, threshold_lut, palette_lut
+
+
+def main():
+    parser = argparse.ArgumentParser(fromfile_prefix_chars='@', description='Plays an image sequence or raw video '
+                                     'on the panel')
+    parser.add_argument('INPUT', type=str, help='.npy, .pgm or raw file, directory or glob pattern of them')
+    parser.add_argument('-d', '--device', help='Serial device path', dest='device', type=str, default='/dev/ttyUSB0')
+    parser.add_argument('-m', '--mirror', help='Additional serial device showing the same frames (repeatable)',
+                        dest='mirrors', action='append', default=[])
+    add_sink_arguments(parser)
+    parser.add_argument('--fps', help='Target frame rate, late frames are dropped', dest='fps', type=float,
+                        default=25.0)
+    parser.add_argument('--size', help='Frame size of raw input, WxH', dest='size', type=str)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--threshold', help='Pixels at or above the level are on, the others off', dest='threshold',
+                       type=int)
+    group.add_argument('--palette', help='Comma separated levels pixels are quantized to', dest='palette', type=str)
+    parser.add_argument('--flip-x', help='Mirror the picture horizontally', dest='flip_x', action='store_true')
+    parser.add_argument('--flip-y', help='Mirror the picture vertically', dest='flip_y', action='store_true')
+    parser.add_argument('--loop', help='Start over at the end of the input', dest='loop', action='store_true')
+
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split('x')) if args.size else (None, None)
+    if args.loop:
+        frames = (frame for _ in itertools.count() for frame in open_frames(args.INPUT, width, height))
+    else:
+        frames = open_frames(args.INPUT, width, height)
+
+    lut = None
+    if args.threshold is not None:
+        lut = threshold_lut(args.threshold)
+    elif args.palette:
+        lut = palette_lut(int(v, 0) for v in args.palette.split(','))
+
+    sink = open_sink_from_args([args.device] + args.mirrors, args)
+    try:
+        stats = play(frames, sink, args.fps, lut, args.flip_x, args.flip_y)
+        print(stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        print(sink.report())
+
+
+if __name__ == '__main__':
+    main()
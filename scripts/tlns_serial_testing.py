@@ -1,8 +1,17 @@
+import os
+import time
 import toml
 from tlns.tlns import *
 import tinyproto
 import argparse
 import serial
+from tlns.link import LinkStats, open_sink, add_sink_arguments, open_sink_from_args
+from tlns.metrics import add_metrics_arguments, metrics_from_args
+from tlns.effects import EFFECTS, make_effect, run_effect
+from tlns.profiling import add_profile_arguments, profile_from_args
+
+
+WATCH_INTERVAL = 0.05
 
 
 class Figure():
@@ -42,20 +51,168 @@ class Rectangle(Figure):
 
 
 def render(board:Board, figure:Figure):
+    # Figures are drawn over each other, cells outside of the figure are left as they are
     if isinstance(figure, Rectangle):
         for x in range(board.w):
             for y in range(board.h):
-                board.set(x, y, figure.in_fig(x, y))
+                if figure.in_fig(x, y):
+                    board.set(x, y, True)
+
+
+def make_figure(config_figure) -> Figure:
+    if config_figure['type'] == 'rect':
+        return Rectangle(config_figure['widht'], config_figure['height'],
+                         config_figure['thickness'], config_figure['filled'],
+                         config_figure['center']['x'], config_figure['center']['y'])
+    print("Unknown figure type: " + str(config_figure['type']))
+    return Figure()
+
+
+class SceneCache:
+    """Figure tables of the last loaded config with the raster (lit Board.pix indices) of every figure.
+    update() rasterizes only the added and changed figures, frame() composes the rasters in table order."""
+
+    def __init__(self, w=Board.WIDTH, h=Board.HEIGHT):
+        self.w = w
+        self.h = h
+        self._configs = {}
+        self._rasters = {}
+
+    def _rasterize(self, figure):
+        board = Board(self.w, self.h)
+        render(board, figure)
+        return tuple(i for i, val in enumerate(board.pix) if val)
+
+    def update(self, config_figures: dict) -> list:
+        """Returns the names of the added, removed and changed figures.
+        If a figure can't be made the exception is passed on and the cache is left as it was."""
+        changed = [name for name in self._configs if name not in config_figures]
+        rasters = {}
+        for name, config_figure in config_figures.items():
+            if self._configs.get(name) != config_figure:
+                rasters[name] = self._rasterize(make_figure(config_figure))
+                changed.append(name)
+            else:
+                rasters[name] = self._rasters[name]
+        self._configs = config_figures
+        self._rasters = rasters
+        return changed
+
+    def frame(self) -> bytearray:
+        pix = bytearray(self.w * self.h)
+        for name in self._configs:
+            for i in self._rasters[name]:
+                pix[i] = True
+        return pix
 
 
 def main():
     parser = argparse.ArgumentParser(fromfile_prefix_chars='@', description='')
-    parser.add_argument('TOML_CONFIG', type=str, help='TOML config file', default='data/serial_test.toml')
+    parser.add_argument('TOML_CONFIG', type=str, help='TOML config file', nargs='?', default='data/serial_test.toml')
     parser.add_argument('-d', '--device', help='Serial device path', dest='device', type=str)
     parser.add_argument('-B', '--baud', help='Serial device baudrate', dest='baud', type=int, default=9600)
+    add_sink_arguments(parser)
+    parser.add_argument('--effect', help='Send an animated effect instead of the figures, one of {} or a TOML file '
+                        'with an [effect] table'.format(', '.join(EFFECTS)), dest='effect', type=str)
+    parser.add_argument('--fps', help='Effect frame rate, 0 for the rate the link clocks frames out at', dest='fps',
+                        type=float, default=30.0)
+    parser.add_argument('--duration', help='Effect duration, s (until interrupted by default)', dest='duration',
+                        type=float, default=None)
+    parser.add_argument('--watch', help='Keep the port open and push the frame again whenever TOML_CONFIG changes',
+                        dest='watch', action='store_true')
+    parser.add_argument('--watch-interval', help='TOML_CONFIG polling interval, s', dest='watch_interval',
+                        type=float, default=WATCH_INTERVAL)
+    add_profile_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    if not args.device and not args.broker:
+        parser.error('-d/--device is required unless --broker is given')
+
+    with profile_from_args(args):
+        if args.effect:
+            run_effect_load(args)
+        elif args.watch:
+            watch(args)
+        else:
+            run(args)
+
 
+def run_effect_load(args):
+    effect = make_effect(args.effect)
+    sink = metrics_from_args(args, open_sink_from_args([args.device], args, args.baud))
+    try:
+        stats = run_effect(effect, sink, args.fps, args.duration, baudrate=args.baud)
+        print(stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        print(sink.report())
+
+
+class RawSerialSink:
+    """Writes frames to the device as they are, without HDLC, like the single shot run"""
+
+    def __init__(self, device, baudrate):
+        self._ser = serial.Serial(device, baudrate=baudrate, bytesize=8, parity='N', stopbits=1, timeout=0.5)
+        self.stats = LinkStats(device)
+
+    def send(self, payload) -> int:
+        started = time.monotonic()
+        self._ser.write(payload)
+        self.stats.on_write(len(payload), time.monotonic() - started)
+        return len(payload)
+
+    def report(self) -> str:
+        return str(self.stats)
+
+    def close(self):
+        self._ser.close()
+
+
+def watch(args):
+    """Stat polls TOML_CONFIG, on change re-rasterizes the changed figures only and writes the frame if it differs
+    from the last one. The panel has no partial update, so the whole frame is written. A plain device gets the
+    frame as is, like the single shot run, the other link options apply as in the effect mode."""
+    sink = metrics_from_args(args, open_sink_from_args([args.device], args, args.baud, device_sink=RawSerialSink))
+
+    scene = SceneCache()
+    last_stat = None
+    last_frame = None
+    print("Watching " + args.TOML_CONFIG)
+    try:
+        while True:
+            try:
+                stat = os.stat(args.TOML_CONFIG)
+                stat = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stat = None  # Editors may replace the file, it comes back
+            if stat is None or stat == last_stat:
+                time.sleep(args.watch_interval)
+                continue
+            last_stat = stat
+            started = time.perf_counter()
+            try:
+                changed = scene.update(toml.load(args.TOML_CONFIG)['BOARD']['figure'])
+            except (toml.TomlDecodeError, KeyError, TypeError, AttributeError) as ex:
+                print("Config error, keeping the last frame: " + str(ex))
+                continue
+            frame = scene.frame()
+            if frame == last_frame:
+                print("No visible change ({})".format(', '.join(changed) or 'formatting'))
+                continue
+            sink.send(frame)
+            last_frame = frame
+            print("{} -> panel in {:.1f} ms".format(', '.join(changed), (time.perf_counter() - started) * 1e3))
+            print(Board(Board.WIDTH, Board.HEIGHT, frame))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+
+
+def run(args):
     board = Board()
 
     toml_config_path = args.TOML_CONFIG
@@ -69,11 +226,7 @@ def main():
     figures = []
 
     for config_figure in config_figures.values():
-        if config_figure['type'] == 'rect':
-            figure = Rectangle(config_figure['widht'], config_figure['height'],
-                               config_figure['thickness'], config_figure['filled'],
-                               config_figure['center']['x'], config_figure['center']['y'])
-        figures.append(figure)
+        figures.append(make_figure(config_figure))
 
     for figure in figures:
         render(board, figure)
@@ -98,6 +251,12 @@ def main():
 
     print()
 
+    if args.broker:
+        sink = open_sink([], broker=args.broker, priority=args.priority)
+        sink.send(board_bytes)
+        sink.close()
+        return
+
     try:
         ser = serial.Serial(args.device, baudrate=args.baud, bytesize=8, parity='N', stopbits=1, timeout=0.5)
         ser.write(board_bytes)
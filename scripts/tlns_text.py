@@ -0,0 +1,42 @@
+import argparse
+
+from tlns.tlns import Board
+from tlns.link import add_sink_arguments, open_sink_from_args
+from tlns.text import Atlas, Ticker, render_text, run_ticker
+
+
+def main():
+    parser = argparse.ArgumentParser(fromfile_prefix_chars='@', description='Shows static or scrolling text on '
+                                     'the panel')
+    parser.add_argument('TEXT', type=str, help='Text to show')
+    parser.add_argument('-d', '--device', help='Serial device path', dest='device', type=str, default='/dev/ttyUSB0')
+    parser.add_argument('-m', '--mirror', help='Additional serial device showing the same frames (repeatable)',
+                        dest='mirrors', action='append', default=[])
+    add_sink_arguments(parser)
+    parser.add_argument('--static', help='Show the beginning of the text without scrolling', dest='static',
+                        action='store_true')
+    parser.add_argument('--fps', help='Scroll speed in columns per second, as fast as the link clocks frames out '
+                        'by default', dest='fps', type=float, default=None)
+    parser.add_argument('--row', help='Top row of the text', dest='row', type=int, default=None)
+
+    args = parser.parse_args()
+
+    atlas = Atlas(Board.HEIGHT, args.row)
+    sink = open_sink_from_args([args.device] + args.mirrors, args)
+    try:
+        if args.static:
+            board = Board()
+            render_text(board, args.TEXT, atlas)
+            print(board)
+            sink.send(board.__bytes__())
+        else:
+            run_ticker(Ticker(args.TEXT, atlas=atlas), sink, args.fps)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        print(sink.report())
+
+
+if __name__ == '__main__':
+    main()
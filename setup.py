@@ -14,7 +14,11 @@ setup(
     license = "MIT",
     keywords = "tlns",
     scripts=['scripts/tlns_gui.py',
-             'scripts/tlns_serial_testing.py'],
+             'scripts/tlns_serial_testing.py',
+             'scripts/tlns_broker.py',
+             'scripts/tlns_emulator.py',
+             'scripts/tlns_play.py',
+             'scripts/tlns_text.py'],
     package_data={'drone_planner': ['data']},
     install_requires=[
         'QtAwesome==0.5.8',
@@ -22,7 +26,8 @@ setup(
         'toml==0.10.2',
         'bitarray==2.1.0',
         'pyserial==3.5',
-        'dearpygui==0.8.64'
+        'dearpygui==0.8.64',
+        'numpy==1.21.2'
     ],
     long_description=read('README.md'),
     classifiers=[
@@ -0,0 +1,32 @@
+import pytest
+
+from tlns.effects import Expression
+
+
+@pytest.mark.parametrize('expression', [
+    '(lambda a=x: a.__class__.__mro__[-1].__subclasses__())()',
+    '(lambda a=x: undefined_name)()',
+    'x.__class__',
+    '[v for v in x]',
+    'undefined_name',
+    '__import__("os")',
+    'sin.__call__(x)',
+    '(x, y)[0]',
+    'w[0]',
+    '"a" * 10',
+])
+def test_rejects_escapes(expression):
+    with pytest.raises(ValueError):
+        Expression(expression, 8, 4)
+
+
+@pytest.mark.parametrize('expression', [
+    '128 + 127 * sin(hypot(x - w / 2, y - h / 2) - 4 * t)',
+    'where((x > 2) & (y < 2), 255, 0)',
+    'clip(x * 40, a_min=0, a_max=200)',
+    '255 if t > 1 else -x',
+    'x[::-1]',
+])
+def test_accepts_expressions(expression):
+    effect = Expression(expression, 8, 4)
+    assert len(bytes(effect.frame(2.0).pix)) == 8 * 4
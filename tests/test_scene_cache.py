@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from tlns_serial_testing import SceneCache  # noqa: E402
+
+
+def rect(x, y, w=3, h=3):
+    return {'type': 'rect', 'widht': w, 'height': h, 'thickness': 1, 'filled': True, 'center': {'x': x, 'y': y}}
+
+
+def test_bad_config_keeps_cache_then_good_config_applies():
+    scene = SceneCache()
+    assert sorted(scene.update({'a': rect(0, 0), 'b': rect(5, 5)})) == ['a', 'b']
+    frame = scene.frame()
+
+    # 'b' removed and 'c' broken: the update fails as a whole
+    with pytest.raises(KeyError):
+        scene.update({'a': rect(0, 0), 'c': {'type': 'rect'}})
+    assert scene.frame() == frame
+
+    # The fixed file loads: 'b' removed, 'c' added, 'a' kept as is
+    assert sorted(scene.update({'a': rect(0, 0), 'c': rect(10, 10)})) == ['b', 'c']
+    expected = SceneCache()
+    expected.update({'a': rect(0, 0), 'c': rect(10, 10)})
+    assert scene.frame() == expected.frame()
@@ -0,0 +1,214 @@
+import heapq
+from array import array
+from collections import deque
+
+ALGORITHM_BFS = 'bfs'
+ALGORITHM_ASTAR = 'astar'
+ALGORITHMS = (ALGORITHM_BFS, ALGORITHM_ASTAR)
+
+MOVES = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def hamiltonian_cycle(w, h):
+    """Position of every cell (flat index x * h + y) on a cycle through all cells of a w x h grid, or None if
+    there is none (w and h both odd). Columns are walked up and down leaving row 0 free, row 0 leads back."""
+    transpose = w % 2
+    if transpose:
+        if h % 2:
+            return None
+        w, h = h, w
+    order = []
+    for x in range(w):
+        rows = range(1, h) if x % 2 == 0 else range(h - 1, 0, -1)
+        order.extend((x, y) for y in rows)
+    order.extend((x, 0) for x in range(w - 1, -1, -1))
+    if transpose:
+        order = [(y, x) for x, y in order]
+        w, h = h, w
+    position = array('i', [0]) * (w * h)
+    for i, (x, y) in enumerate(order):
+        position[x * h + y] = i
+    return position
+
+
+class Autopilot:
+    """Picks the next move of a snake inside the rectangle (x0, y0)..(x1, y1) (inclusive).
+    The snake follows a Hamiltonian cycle of the rectangle, which never traps it, and takes shortcuts towards
+    the target: the first step of the shortest path (BFS or A*) if it does not jump over the tail along the cycle,
+    otherwise the neighbour closest to the target along the cycle. margin keeps room for the growth after eating.
+    Without a cycle (both sides odd) the step with the most room wins.
+    All search state lives in flat buffers allocated once, marked with generation stamps instead of being cleared,
+    so a tick costs at most a few passes over the grid whatever the board size."""
+
+    MARGIN = 4
+
+    def __init__(self, x0, y0, x1, y1, algorithm=ALGORITHM_BFS, margin=MARGIN):
+        assert algorithm in ALGORITHMS
+        self.x0, self.y0 = x0, y0
+        self.w = x1 - x0 + 1
+        self.h = y1 - y0 + 1
+        self.algorithm = algorithm
+        self.margin = margin
+        size = self.w * self.h
+        self._blocked = array('I', [0]) * size
+        self._target = array('I', [0]) * size
+        self._seen = array('I', [0]) * size
+        self._parent = array('i', [0]) * size
+        self._cost = array('i', [0]) * size
+        self._queue = deque()
+        self._heap = []
+        self._tick = 0
+        self._search = 0
+        self._cycle = hamiltonian_cycle(self.w, self.h)
+        # Neighbours of every cell, precomputed
+        self._neighbours = []
+        for x in range(self.w):
+            for y in range(self.h):
+                self._neighbours.append(tuple((x + dx) * self.h + y + dy for dx, dy in MOVES
+                                              if 0 <= x + dx < self.w and 0 <= y + dy < self.h))
+        self.path_moves = 0
+        self.shortcut_moves = 0
+        self.cycle_moves = 0
+        self.escape_moves = 0
+
+    def _index(self, cell):
+        x, y = cell[0] - self.x0, cell[1] - self.y0
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return x * self.h + y
+        return None
+
+    def _move(self, src, dst):
+        return dst // self.h - src // self.h, dst % self.h - src % self.h
+
+    def _free(self, i):
+        return self._blocked[i] != self._tick
+
+    def _shortest_path_step(self, start, targets):
+        """First cell of the shortest free path from start to a target, None if there is none"""
+        self._search += 1
+        stamp = self._search
+        seen, parent, cost = self._seen, self._parent, self._cost
+        seen[start] = stamp
+        parent[start] = -1
+        cost[start] = 0
+        if self.algorithm == ALGORITHM_ASTAR:
+            goals = [(i // self.h, i % self.h) for i in targets]
+
+            def estimate(i):
+                x, y = i // self.h, i % self.h
+                return min(abs(x - gx) + abs(y - gy) for gx, gy in goals)
+            heap = self._heap
+            heap.clear()
+            heapq.heappush(heap, (estimate(start), start))
+            pop = lambda: heapq.heappop(heap)[1]
+            push = lambda i: heapq.heappush(heap, (cost[i] + estimate(i), i))
+            pending = heap
+        else:
+            queue = self._queue
+            queue.clear()
+            queue.append(start)
+            pop = queue.popleft
+            push = queue.append
+            pending = queue
+        while pending:
+            i = pop()
+            if i != start and self._target[i] == self._tick:
+                while parent[i] != start:
+                    i = parent[i]
+                return i
+            for n in self._neighbours[i]:
+                if (seen[n] != stamp or cost[i] + 1 < cost[n]) and self._free(n):
+                    seen[n] = stamp
+                    parent[n] = i
+                    cost[n] = cost[i] + 1
+                    push(n)
+        return None
+
+    def _room(self, start, enough):
+        """Free cells reachable from start, counting stops at enough"""
+        self._search += 1
+        stamp = self._search
+        seen = self._seen
+        queue = self._queue
+        queue.clear()
+        queue.append(start)
+        seen[start] = stamp
+        count = 0
+        while queue and count < enough:
+            i = queue.popleft()
+            count += 1
+            for n in self._neighbours[i]:
+                if seen[n] != stamp and self._free(n):
+                    seen[n] = stamp
+                    queue.append(n)
+        return count
+
+    def _cycle_distance(self, src, dst):
+        return (self._cycle[dst] - self._cycle[src]) % len(self._cycle)
+
+    def plan(self, head, body, targets):
+        """head: (x, y) the move starts from, body: cells that stay occupied during the move, from the head
+        to the tail, targets: cells worth going to. Returns (dx, dy) or None if every neighbour is blocked."""
+        self._tick += 1
+        tick = self._tick
+        start = self._index(head)
+        if start is None:
+            return None
+        length = 1
+        tail = start
+        for cell in body:
+            i = self._index(cell)
+            if i is not None:
+                self._blocked[i] = tick
+                length += 1
+                tail = i
+        goals = []
+        for cell in targets:
+            i = self._index(cell)
+            if i is not None:
+                self._target[i] = tick
+                goals.append(i)
+        self._blocked[start] = tick
+
+        if self._cycle is not None and goals and length < len(self._cycle) // 2:
+            # A step may skip cycle cells as long as it lands neither past the target nor past the tail
+            # (and the growth behind it), so every move gets closer to the target along the cycle.
+            # A snake filling half the board sticks to the cycle.
+            limit = min((self._cycle_distance(start, tail) or len(self._cycle)) - self.margin,
+                        min(self._cycle_distance(start, goal) for goal in goals) + 1)
+            # The body may not lie in cycle order (at the start, after an escape), the room is checked as well
+            allowed = [n for n in self._neighbours[start] if self._free(n) and
+                       0 < self._cycle_distance(start, n) < limit and self._room(n, length) >= length]
+            if allowed:
+                step = self._shortest_path_step(start, goals)
+                if step in allowed:
+                    self.path_moves += 1
+                    return self._move(start, step)
+                step = max(allowed, key=lambda n: self._cycle_distance(start, n))
+                if self._cycle_distance(start, step) > 1:
+                    self.shortcut_moves += 1
+                    return self._move(start, step)
+        if self._cycle is not None:
+            for n in self._neighbours[start]:
+                if self._cycle_distance(start, n) == 1 and self._free(n):
+                    self.cycle_moves += 1
+                    return self._move(start, n)
+        elif goals:
+            step = self._shortest_path_step(start, goals)
+            if step is not None and self._room(step, length) >= length:
+                self.path_moves += 1
+                return self._move(start, step)
+        best, best_room = None, 0
+        for n in self._neighbours[start]:
+            if self._free(n):
+                room = self._room(n, length)
+                if room > best_room:
+                    best, best_room = n, room
+        if best is None:
+            return None
+        self.escape_moves += 1
+        return self._move(start, best)
+
+    def report(self) -> str:
+        return 'autopilot ({}): path moves {}, shortcuts {}, cycle moves {}, escape moves {}'.format(
+            self.algorithm, self.path_moves, self.shortcut_moves, self.cycle_moves, self.escape_moves)
@@ -0,0 +1,173 @@
+import time
+import socket
+import struct
+import asyncio
+import os
+import argparse
+from itertools import count
+from logging import getLogger
+
+from tlns.link import DEFAULT_BAUDRATE, LinkStats, wire_time
+
+logger = getLogger(__name__)
+
+DEFAULT_ADDRESS = '/tmp/tlns_broker.sock'
+
+# Producer -> broker message: priority, payload length, payload
+HEADER = struct.Struct('!BH')
+MAX_PRIORITY = 0xFF
+
+POLICY_PRIORITY = 'priority'    # Highest priority connected source, the most recent one on a tie
+POLICY_RECENT = 'recent'        # Whoever published last
+POLICIES = (POLICY_PRIORITY, POLICY_RECENT)
+
+
+def parse_address(address):
+    """'host:port' is a TCP address, anything else is a Unix socket path"""
+    if not address.startswith('/') and ':' in address:
+        host, port = address.rsplit(':', 1)
+        return socket.AF_INET, (host or 'localhost', int(port))
+    return socket.AF_UNIX, address
+
+
+def parse_priority(text) -> int:
+    """argparse type of a source priority, it goes in a byte of the message header"""
+    priority = int(text)
+    if not 0 <= priority <= MAX_PRIORITY:
+        raise argparse.ArgumentTypeError('priority {} out of 0..{}'.format(priority, MAX_PRIORITY))
+    return priority
+
+
+class Source:
+    def __init__(self, name):
+        self.name = name
+        self.priority = 0
+        self.frame = None
+        self.updated = 0.0
+        self.frames_received = 0
+        self.connected = True
+
+    def publish(self, priority, frame):
+        self.priority = priority
+        self.frame = frame
+        self.updated = time.monotonic()
+        self.frames_received += 1
+
+
+class FrameBroker:
+    """Owns the panel link and forwards frames of several local producers to it.
+    Every producer connection is a source, only the latest frame of a source is kept. The transmitter
+    forwards the frame of the source selected by the policy and never faster than the link can clock it out,
+    frames published in between are coalesced. A disconnected source is kept until its last frame has been
+    forwarded or superseded, so a one shot producer may send its frame and leave."""
+
+    def __init__(self, sink, baudrate=DEFAULT_BAUDRATE, policy=POLICY_PRIORITY):
+        assert policy in POLICIES
+        self.sink = sink
+        self.baudrate = baudrate
+        self.policy = policy
+        self.sources = []
+        self.frames_received = 0
+        self.frames_sent = 0
+        self._last_sent = None
+        self._pending = None
+        self._source_ids = count(1)
+
+    def select(self):
+        sources = [source for source in self.sources if source.frame is not None]
+        if not sources:
+            return None
+        if self.policy == POLICY_RECENT:
+            return max(sources, key=lambda s: s.updated)
+        return max(sources, key=lambda s: (s.priority, s.updated))
+
+    async def serve(self, address=DEFAULT_ADDRESS):
+        self._pending = asyncio.Event()
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.unlink(addr)
+            server = await asyncio.start_unix_server(self._on_client, addr)
+        else:
+            server = await asyncio.start_server(self._on_client, *addr)
+        logger.info('Broker listening on %s', address)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._transmit())
+
+    async def _on_client(self, reader, writer):
+        source = Source('#{}'.format(next(self._source_ids)))
+        self.sources.append(source)
+        logger.info('Source %s connected', source.name)
+        try:
+            while True:
+                priority, size = HEADER.unpack(await reader.readexactly(HEADER.size))
+                source.publish(priority, await reader.readexactly(size))
+                self.frames_received += 1
+                self._pending.set()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            logger.info('Source %s disconnected after %d frames', source.name, source.frames_received)
+            source.connected = False
+            if source.frame is None:
+                self.sources.remove(source)
+            writer.close()
+            # Let the transmitter fall back to another source
+            self._pending.set()
+
+    def _forget_disconnected(self, selected_at):
+        """Drops the disconnected sources whose last frame came before the latest selection: it was either
+        forwarded then or lost to the selected one"""
+        sources = [source for source in self.sources if source.connected or source.updated > selected_at]
+        if len(sources) != len(self.sources):
+            self.sources = sources
+            self._pending.set()
+
+    async def _transmit(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await self._pending.wait()
+            self._pending.clear()
+            selected_at = time.monotonic()
+            source = self.select()
+            if source is None or source.frame is self._last_sent:
+                self._forget_disconnected(selected_at)
+                continue
+            frame = source.frame
+            started = time.monotonic()
+            size = await loop.run_in_executor(None, self.sink.send, frame)
+            self._last_sent = frame
+            self.frames_sent += 1
+            self._forget_disconnected(selected_at)
+            delay = wire_time(size, self.baudrate) - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def report(self) -> str:
+        return 'broker: received {}, sent {}, coalesced {}'.format(
+            self.frames_received, self.frames_sent, self.frames_received - self.frames_sent)
+
+
+class BrokerClient:
+    """Producer side of the broker, a drop-in replacement of the serial sinks"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, priority=0):
+        assert 0 <= priority <= MAX_PRIORITY
+        family, addr = parse_address(address)
+        self.priority = priority
+        self.stats = LinkStats('broker ' + address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.connect(addr)
+
+    def send(self, payload) -> int:
+        message = HEADER.pack(self.priority, len(payload)) + bytes(payload)
+        started = time.monotonic()
+        self._sock.sendall(message)
+        self.stats.on_write(len(message), time.monotonic() - started)
+        return len(message)
+
+    def report(self) -> str:
+        return str(self.stats)
+
+    def close(self):
+        self._sock.close()
@@ -0,0 +1,154 @@
+import time
+import threading
+from logging import getLogger
+
+from tlns.link import DEFAULT_BAUDRATE, HdlcEncoder, LinkStats, open_serial, wire_time
+
+logger = getLogger(__name__)
+
+# Bus frame: HDLC payload is address, panel frame. Every panel takes frames sent to its address or to BROADCAST.
+BROADCAST = 0xFF
+MAX_ADDRESS = 0xFE
+
+
+def parse_addresses(text) -> list:
+    """'1,2,5-7' -> [1, 2, 5, 6, 7]"""
+    addresses = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        addresses.extend(range(int(first, 0), int(last or first, 0) + 1))
+    for address in addresses:
+        if not 0 <= address <= MAX_ADDRESS:
+            raise ValueError('Panel address {} out of 0..{}'.format(address, MAX_ADDRESS))
+    return addresses
+
+
+class PanelStats(LinkStats):
+    """frames_dropped counts frames replaced by a newer one before their turn, frames_skipped frames equal to what
+    the panel already shows"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.frames_skipped = 0
+
+    def __str__(self):
+        return '{}, unchanged {}'.format(super().__str__(), self.frames_skipped)
+
+
+class BusPanel:
+    """Sink of one addressed panel on a BusScheduler"""
+
+    def __init__(self, bus, address):
+        self.bus = bus
+        self.address = address
+        self.stats = PanelStats('{}#{}'.format(bus.device, address))
+        self.pending = None
+        self.shown = None
+
+    def send(self, payload) -> int:
+        return self.bus.submit(self, payload)
+
+    def report(self) -> str:
+        return str(self.stats)
+
+    def close(self):
+        self.bus.detach(self)
+
+
+class BusScheduler:
+    """Several panels daisy chained on one serial line (RS-485 style), told apart by the address leading every
+    frame. A panel keeps only its newest frame, the writer thread serves the panels with a pending frame round
+    robin starting after the last one served, so a fast producer can't starve the others and an idle panel takes
+    no bus time. Writes are paced to the baudrate, so the next panel is picked once the line is free rather than
+    while the OS buffer still holds a backlog. A frame equal to what its panel shows already is skipped. The bus
+    is closed with its last panel, the frames still pending are written first."""
+
+    def __init__(self, device, baudrate=DEFAULT_BAUDRATE):
+        self.device = device
+        self.baudrate = baudrate
+        self._ser = open_serial(device, baudrate)
+        self._encoder = HdlcEncoder()
+        self._panels = []
+        self._next = 0
+        self._cond = threading.Condition()
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name='bus ' + device, daemon=True)
+        self._thread.start()
+
+    def panel(self, address) -> BusPanel:
+        assert 0 <= address <= MAX_ADDRESS
+        with self._cond:
+            assert all(panel.address != address for panel in self._panels)
+            panel = BusPanel(self, address)
+            self._panels.append(panel)
+        return panel
+
+    def detach(self, panel):
+        with self._cond:
+            # The last frame of a one shot producer still goes out
+            while panel.pending is not None and self._keep_going:
+                self._cond.wait()
+            self._panels.remove(panel)
+            last = not self._panels
+        if last:
+            self.close()
+
+    def submit(self, panel, payload) -> int:
+        with self._cond:
+            if panel.pending is not None:
+                panel.stats.frames_dropped += 1
+            panel.pending = bytes(payload)
+            self._cond.notify_all()
+        return len(payload) + 1
+
+    def _take(self):
+        """Called with the lock held: the next panel in turn with a changed frame, or None.
+        Wakes up detach() waiting for the pending frame of its panel to be taken."""
+        self._cond.notify_all()
+        count = len(self._panels)
+        for i in range(count):
+            index = (self._next + i) % count
+            panel = self._panels[index]
+            if panel.pending is None:
+                continue
+            frame, panel.pending = panel.pending, None
+            if frame == panel.shown:
+                panel.stats.frames_skipped += 1
+                continue
+            self._next = index + 1
+            return panel, frame
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                taken = self._take()
+                while taken is None:
+                    # Only stopped once every pending frame is written
+                    if not self._keep_going:
+                        return
+                    self._cond.wait()
+                    taken = self._take()
+            panel, frame = taken
+            started = time.monotonic()
+            data = self._encoder.encode(bytes((panel.address,)) + frame)
+            encoded = time.monotonic()
+            self._ser.write(data)
+            panel.stats.encode_time += encoded - started
+            panel.stats.on_write(len(data), time.monotonic() - encoded)
+            panel.shown = frame
+            delay = wire_time(len(data), self.baudrate) - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def report(self) -> str:
+        with self._cond:
+            return '\n'.join(str(panel.stats) for panel in self._panels)
+
+    def close(self):
+        with self._cond:
+            self._keep_going = False
+            self._cond.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+        self._ser.close()
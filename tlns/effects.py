@@ -0,0 +1,243 @@
+import ast
+import time
+from logging import getLogger
+
+import numpy as np
+
+from tlns.tlns import Board, PIXEL_MAX_BRIGHTNESS
+from tlns.link import DEFAULT_BAUDRATE, wire_time
+
+logger = getLogger(__name__)
+
+
+class Effect:
+    """Renders frame after frame into one reused Board. pixels is a numpy view of board.pix indexed [x, y],
+    x and y are float coordinate grids of the same shape."""
+
+    def __init__(self, w_=None, h_=None, seed=None):
+        self.board = Board(w_, h_)
+        self.w, self.h = self.board.w, self.board.h
+        self.pixels = np.frombuffer(self.board.pix, np.uint8).reshape(self.w, self.h)
+        self.x, self.y = np.meshgrid(np.arange(self.w, dtype=np.float32), np.arange(self.h, dtype=np.float32),
+                                     indexing='ij')
+        self.rng = np.random.default_rng(seed)
+
+    def render(self, t):
+        raise NotImplementedError
+
+    def frame(self, t) -> Board:
+        self.render(t)
+        return self.board
+
+
+class Plasma(Effect):
+    def __init__(self, w_=None, h_=None, seed=None, scale=4.0, speed=1.0):
+        super().__init__(w_, h_, seed)
+        self.scale = scale
+        self.speed = speed
+        self._acc = np.empty_like(self.x)
+        self._tmp = np.empty_like(self.x)
+        cx, cy = self.x - self.w / 2, self.y - self.h / 2
+        self._radius = np.hypot(cx, cy) / scale
+
+    def render(self, t):
+        t *= self.speed
+        acc, tmp = self._acc, self._tmp
+        np.multiply(self.x, 1 / self.scale, out=acc)
+        np.add(acc, t, out=acc)
+        np.sin(acc, out=acc)
+        np.multiply(self.y, 1 / self.scale, out=tmp)
+        np.subtract(tmp, 0.7 * t, out=tmp)
+        np.sin(tmp, out=tmp)
+        np.add(acc, tmp, out=acc)
+        np.subtract(self._radius, 1.3 * t, out=tmp)
+        np.sin(tmp, out=tmp)
+        np.add(acc, tmp, out=acc)
+        # acc is in -3..3
+        np.multiply(acc, PIXEL_MAX_BRIGHTNESS / 6, out=acc)
+        np.add(acc, PIXEL_MAX_BRIGHTNESS / 2, out=acc)
+        np.copyto(self.pixels, acc, casting='unsafe')
+
+
+class Fire(Effect):
+    """Heat is seeded on the bottom row and rises, averaged over the cells below and cooled on the way.
+    By default the cooling lets the flames reach about the upper third of the board."""
+    COOLING_HEIGHT = 400
+
+    def __init__(self, w_=None, h_=None, seed=None, cooling=None):
+        super().__init__(w_, h_, seed)
+        self.cooling = cooling if cooling is not None else self.COOLING_HEIGHT // self.h
+        self._heat = np.zeros((self.w, self.h + 1), np.int32)
+        self._below = np.empty((self.w, self.h), np.int32)
+
+    def render(self, t):
+        heat, below = self._heat, self._below
+        heat[:, -1] = self.rng.integers(0, PIXEL_MAX_BRIGHTNESS + 1, self.w)
+        # Row y takes the average of y + 1 (weighted twice), its left and right neighbours and y + 2
+        np.multiply(heat[:, 1:], 2, out=below)
+        below += np.roll(heat[:, 1:], 1, axis=0)
+        below += np.roll(heat[:, 1:], -1, axis=0)
+        below[:, :-1] += heat[:, 2:]
+        below[:, -1] += heat[:, -1]
+        below //= 5
+        below -= self.rng.integers(0, self.cooling + 1, below.shape)
+        np.clip(below, 0, PIXEL_MAX_BRIGHTNESS, out=heat[:, :-1])
+        np.copyto(self.pixels, heat[:, :-1], casting='unsafe')
+
+
+class Life(Effect):
+    """Conway's Game of Life on a torus, reseeded when it dies out or stops changing"""
+
+    def __init__(self, w_=None, h_=None, seed=None, density=0.3):
+        super().__init__(w_, h_, seed)
+        self.density = density
+        self._cells = np.zeros((self.w, self.h), np.uint8)
+        self._neighbours = np.empty((self.w, self.h), np.uint8)
+        self._previous = np.empty((self.w, self.h), np.uint8)
+        self.reseed()
+
+    def reseed(self):
+        self._cells[...] = self.rng.random((self.w, self.h)) < self.density
+
+    def render(self, t):
+        cells, neighbours = self._cells, self._neighbours
+        neighbours.fill(0)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx or dy:
+                    neighbours += np.roll(np.roll(cells, dx, axis=0), dy, axis=1)
+        self._previous[...] = cells
+        cells[...] = (neighbours == 3) | (cells.astype(bool) & (neighbours == 2))
+        if not cells.any() or np.array_equal(cells, self._previous):
+            self.reseed()
+        np.multiply(cells, PIXEL_MAX_BRIGHTNESS, out=self.pixels)
+
+
+class Noise(Effect):
+    def __init__(self, w_=None, h_=None, seed=None, density=1.0):
+        super().__init__(w_, h_, seed)
+        self.density = density
+        self._random = np.empty((self.w, self.h))
+
+    def render(self, t):
+        self.rng.random(out=self._random)
+        if self.density < 1.0:
+            np.copyto(self.pixels, self._random < self.density, casting='unsafe')
+            self.pixels *= PIXEL_MAX_BRIGHTNESS
+        else:
+            np.multiply(self._random, PIXEL_MAX_BRIGHTNESS + 1, out=self._random)
+            np.copyto(self.pixels, self._random, casting='unsafe')
+
+
+class Expression(Effect):
+    """Per-pixel brightness f(x, y, t) given as a Python expression over numpy arrays, e.g.
+    '128 + 127 * sin(hypot(x - w / 2, y - h / 2) - 4 * t)'. It is compiled once and evaluated for all pixels
+    at a time, only the names below are visible to it. The result is clipped to 0..255.
+    The expression is checked on its syntax tree before it is compiled: arithmetic, comparisons, conditionals,
+    constants, the names below and calls of the functions among them, subscripts of x and y. Anything else
+    (attributes, lambdas, comprehensions, ...) is rejected."""
+    NAMES = {
+        'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'arctan2': np.arctan2, 'hypot': np.hypot, 'sqrt': np.sqrt,
+        'exp': np.exp, 'log': np.log, 'abs': np.abs, 'floor': np.floor, 'mod': np.mod, 'where': np.where,
+        'minimum': np.minimum, 'maximum': np.maximum, 'clip': np.clip, 'pi': np.pi,
+    }
+    NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Constant, ast.Name,
+             ast.Call, ast.keyword, ast.Subscript, ast.Slice, ast.Tuple, ast.Load, ast.operator, ast.unaryop,
+             ast.boolop, ast.cmpop)
+
+    def __init__(self, expression, w_=None, h_=None, seed=None):
+        super().__init__(w_, h_, seed)
+        self.expression = expression
+        self._namespace = dict(self.NAMES, x=self.x, y=self.y, w=self.w, h=self.h, t=0.0)
+        tree = ast.parse(expression, '<effect expression>', 'eval')
+        self._check(tree)
+        self._code = compile(tree, '<effect expression>', 'eval')
+        self._clipped = np.empty_like(self.x)
+
+    def _check(self, tree):
+        """Raises ValueError on the first node of tree outside the allowed subset"""
+        for node in ast.walk(tree):
+            if not isinstance(node, self.NODES):
+                raise ValueError('{} not allowed in effect expression'.format(type(node).__name__))
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, complex, type(...))):
+                raise ValueError('{!r} not allowed in effect expression'.format(node.value))
+            if isinstance(node, ast.Name) and node.id not in self._namespace:
+                raise ValueError('Unknown name in effect expression: {}'.format(node.id))
+            if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and
+                                                   callable(self.NAMES.get(node.func.id))):
+                raise ValueError('Only the functions {} can be called in effect expression'.format(
+                    ', '.join(name for name, value in self.NAMES.items() if callable(value))))
+            if isinstance(node, ast.Subscript) and not (isinstance(node.value, ast.Name) and
+                                                        isinstance(self._namespace.get(node.value.id), np.ndarray)):
+                raise ValueError('Only x and y can be subscripted in effect expression')
+
+    def render(self, t):
+        self._namespace['t'] = t
+        value = eval(self._code, {'__builtins__': {}}, self._namespace)
+        np.clip(np.broadcast_to(value, self._clipped.shape), 0, PIXEL_MAX_BRIGHTNESS, out=self._clipped)
+        np.copyto(self.pixels, self._clipped, casting='unsafe')
+
+
+EFFECTS = {
+    'plasma': Plasma,
+    'fire': Fire,
+    'life': Life,
+    'noise': Noise,
+}
+
+
+def load_effect(path, w_=None, h_=None) -> Effect:
+    """[effect] table of a TOML file: either expression = '...' or name = '<one of EFFECTS>' with its parameters"""
+    import toml
+
+    params = dict(toml.load(path).get('effect', {}))
+    if 'expression' in params:
+        return Expression(params.pop('expression'), w_, h_, **params)
+    if 'name' not in params:
+        raise ValueError('{}: [effect] needs a name or an expression'.format(path))
+    return make_effect(params.pop('name'), w_, h_, **params)
+
+
+def make_effect(name, w_=None, h_=None, **params) -> Effect:
+    """name is one of EFFECTS or a TOML file, see load_effect()"""
+    if name.endswith('.toml'):
+        return load_effect(name, w_, h_)
+    if name not in EFFECTS:
+        raise ValueError('Unknown effect {}, known: {}'.format(name, ', '.join(EFFECTS)))
+    return EFFECTS[name](w_, h_, **params)
+
+
+class EffectStats:
+    def __init__(self):
+        self.frames = 0
+        self.late = 0
+        self.render_time = 0.0
+        self.started = time.monotonic()
+
+    def __str__(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return 'frames {} ({:.1f} fps), late {}, render {:.1f} us/frame'.format(
+            self.frames, self.frames / elapsed, self.late, self.render_time / max(self.frames, 1) * 1e6)
+
+
+def run_effect(effect: Effect, sink, fps, duration=None, keep_going=lambda: True,
+               baudrate=DEFAULT_BAUDRATE) -> EffectStats:
+    """Sends effect frames at fps, with 0 at the rate the link clocks them out at baudrate, like run_ticker().
+    A late frame is not made up for, the schedule restarts from now."""
+    stats = EffectStats()
+    started = next_at = time.monotonic()
+    while keep_going() and (duration is None or time.monotonic() - started < duration):
+        rendered = time.monotonic()
+        board = effect.frame(rendered - started)
+        stats.render_time += time.monotonic() - rendered
+        size = sink.send(board.__bytes__())
+        stats.frames += 1
+        next_at += 1.0 / fps if fps else wire_time(size, baudrate)
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            if fps:
+                stats.late += 1
+            next_at = time.monotonic()
+    return stats
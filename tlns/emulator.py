@@ -0,0 +1,201 @@
+import os
+import tty
+import time
+import random
+import select
+import threading
+from collections import deque
+from logging import getLogger
+
+import tinyproto
+
+from tlns.tlns import Board
+from tlns.link import HdlcEncoder, wire_time
+from tlns.flow import MSG_ACK, MSG_BUSY, MSG_READY
+from tlns.transport import FdSink
+from tlns.bus import BROADCAST
+
+logger = getLogger(__name__)
+
+PROTOCOL_HDLC = 'hdlc'  # Plain HDLC frames, optionally with tlns.flow acks
+PROTOCOL_FD = 'fd'      # tinyproto full duplex protocol, see tlns.transport
+PROTOCOLS = (PROTOCOL_HDLC, PROTOCOL_FD)
+
+
+class VirtualPanel:
+    """Pty backed stand-in of a panel: open device with any of the sinks instead of a real serial port.
+    Incoming HDLC frames are deframed and shown (kept as the current frame).
+    With flow_control frames carry a seq byte, are queued in a buffer of buffer_size frames which is drained
+    at frame_rate (immediately if None), every drained frame is acked. The panel reports busy while the buffer
+    is full and ready once it drains, a frame arriving into a full buffer is an overrun and is not acked.
+    With the fd protocol the panel is the tinyproto Fd peer of tlns.transport.FdSink.
+    With addresses the pty is a tlns.bus line with a panel per address: frames lead with the address, a panel
+    shows the frames sent to its address or broadcast (see frames and board(address)), others are ignored.
+    error_rate is the probability of a bit flip in every byte received or sent, baudrate throttles the
+    reception to the speed of a real line."""
+    BUFFER_SIZE = 4
+    FD_WINDOW = 7
+    POLL_INTERVAL = 0.1
+    FD_POLL_INTERVAL = 0.001
+
+    def __init__(self, frame_rate=None, flow_control=False, buffer_size=BUFFER_SIZE, w_=None, h_=None,
+                 protocol=PROTOCOL_HDLC, error_rate=0.0, baudrate=None, seed=None, addresses=None):
+        assert protocol in PROTOCOLS
+        assert addresses is None or (protocol == PROTOCOL_HDLC and not flow_control)
+        self.protocol = protocol
+        self.error_rate = error_rate
+        self.baudrate = baudrate
+        self.corrupted_bytes = 0
+        self._random = random.Random(seed)
+        self.frame_rate = frame_rate
+        self.flow_control = flow_control
+        self.buffer_size = buffer_size
+        self.w = w_ if w_ else Board.WIDTH
+        self.h = h_ if h_ else Board.HEIGHT
+        self.frame = bytes(self.w * self.h)
+        self.addresses = tuple(addresses) if addresses is not None else None
+        self.frames = dict((address, self.frame) for address in self.addresses or ())
+        self.shown_by_address = dict((address, 0) for address in self.addresses or ())
+        self.frames_ignored = 0
+        self.frames_received = 0
+        self.frames_shown = 0
+        self.overruns = 0
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+        if protocol == PROTOCOL_FD:
+            self._p = tinyproto.Fd()
+            self._p.window_size = self.FD_WINDOW
+            self._p.mtu = FdSink.MTU
+            self._p.on_read = self._on_fd_frame
+        else:
+            self._p = tinyproto.Hdlc()
+            self._p.on_read = self._on_frame
+        self._p.begin()
+        self._encoder = HdlcEncoder()
+        self._write_lock = threading.Lock()
+        self._buffer = deque()
+        self._busy = False
+        self._keep_going = True
+        self._threads = [threading.Thread(target=self._read, name='panel_reader', daemon=True)]
+        if flow_control and frame_rate:
+            self._threads.append(threading.Thread(target=self._drain, name='panel_display', daemon=True))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._keep_going = False
+        for thread in self._threads:
+            thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def board(self, address=None) -> Board:
+        frame = self.frame if address is None else self.frames[address]
+        return Board(self.w, self.h, bytearray(frame))
+
+    def _reply(self, message):
+        with self._write_lock:
+            os.write(self._master, self._encoder.encode(message))
+
+    def _show(self, frame):
+        self.frame = bytes(frame)
+        self.frames_shown += 1
+
+    def _corrupt(self, data):
+        if not self.error_rate:
+            return data
+        data = bytearray(data)
+        for i in range(len(data)):
+            if self._random.random() < self.error_rate:
+                data[i] ^= 1 << self._random.randrange(8)
+                self.corrupted_bytes += 1
+        return data
+
+    def _on_fd_frame(self, frame):
+        self.frames_received += 1
+        self._show(frame)
+
+    def _on_addressed_frame(self, frame):
+        address, payload = frame[0], bytes(frame[1:])
+        targets = self.addresses if address == BROADCAST else (address,) if address in self.frames else ()
+        if not targets:
+            self.frames_ignored += 1
+            return
+        for target in targets:
+            self.frames[target] = payload
+            self.shown_by_address[target] += 1
+        self._show(payload)
+
+    def _on_frame(self, frame):
+        self.frames_received += 1
+        if self.addresses is not None:
+            self._on_addressed_frame(frame)
+            return
+        if not self.flow_control:
+            self._show(frame)
+            return
+        seq, payload = frame[0], frame[1:]
+        if not self.frame_rate:
+            self._show(payload)
+            self._reply(bytes([MSG_ACK, seq]))
+            return
+        if len(self._buffer) >= self.buffer_size:
+            self.overruns += 1
+            return
+        self._buffer.append((seq, payload))
+        if len(self._buffer) >= self.buffer_size and not self._busy:
+            self._busy = True
+            self._reply(bytes([MSG_BUSY]))
+
+    def _read(self):
+        fd = self.protocol == PROTOCOL_FD
+        poll_interval = self.FD_POLL_INTERVAL if fd else self.POLL_INTERVAL
+        while self._keep_going:
+            readable, _, _ = select.select([self._master], [], [], poll_interval)
+            if readable:
+                data = os.read(self._master, 4096)
+                if self.baudrate:
+                    time.sleep(wire_time(len(data), self.baudrate))
+                self._p.rx(self._corrupt(data))
+            if fd:
+                out = self._p.tx()
+                if out:
+                    with self._write_lock:
+                        os.write(self._master, self._corrupt(out))
+
+    def _drain(self):
+        period = 1.0 / self.frame_rate
+        next_at = time.monotonic()
+        while self._keep_going:
+            next_at += period
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()
+            if not self._buffer:
+                continue
+            seq, payload = self._buffer.popleft()
+            self._show(payload)
+            self._reply(bytes([MSG_ACK, seq]))
+            if self._busy:
+                self._busy = False
+                self._reply(bytes([MSG_READY]))
+
+    def report(self) -> str:
+        report = '{}: received {}, shown {}, overruns {}, corrupted bytes {}'.format(
+            self.device, self.frames_received, self.frames_shown, self.overruns, self.corrupted_bytes)
+        if self.addresses is not None:
+            report += ', ignored {}, shown by address {}'.format(
+                self.frames_ignored, ', '.join('#{}: {}'.format(a, n) for a, n in self.shown_by_address.items()))
+        return report
@@ -0,0 +1,115 @@
+import time
+import threading
+from collections import deque
+from logging import getLogger
+
+import serial
+
+from tlns.link import DEFAULT_BAUDRATE, HdlcEncoder, LinkStats, open_serial
+
+logger = getLogger(__name__)
+
+
+class DeviceWriter:
+    """Writes frames to one device from its own thread.
+    The queue is bounded: when the device can't keep up the oldest (stale) frame is dropped,
+    so a stalled device never blocks the producer or the other devices."""
+    QUEUE_SIZE = 2
+    JOIN_TIMEOUT = 1.0
+
+    def __init__(self, device, baudrate=DEFAULT_BAUDRATE, queue_size=QUEUE_SIZE):
+        self.device = device
+        self.stats = LinkStats(device)
+        self._ser = open_serial(device, baudrate)
+        self._queue = deque(maxlen=queue_size)
+        self._cond = threading.Condition()
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name='writer ' + device, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._keep_going = False
+            self._cond.notify()
+        if self._thread.ident is not None:
+            self._thread.join(self.JOIN_TIMEOUT)
+        if self._thread.is_alive():
+            logger.warning('Writer of %s is stuck, abandoning it', self.device)
+        self._ser.close()
+
+    def put(self, frame):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.stats.frames_dropped += 1
+            self._queue.append(frame)
+            self._cond.notify()
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._keep_going and not self._queue:
+                    self._cond.wait()
+                if not self._keep_going:
+                    return
+                frame = self._queue.popleft()
+            started = time.monotonic()
+            try:
+                self._ser.write(frame)
+            except serial.SerialException as ex:
+                logger.warning('Write to %s failed: %s', self.device, ex)
+                self.stats.frames_dropped += 1
+                continue
+            self.stats.on_write(len(frame), time.monotonic() - started)
+
+
+class FanoutSink:
+    """Delivers the same frame to several mirrored panels.
+    The frame is HDLC encoded once and handed to an independent DeviceWriter per device."""
+
+    def __init__(self, devices, baudrate=DEFAULT_BAUDRATE, queue_size=DeviceWriter.QUEUE_SIZE):
+        self._encoder = HdlcEncoder()
+        self.writers = []
+        try:
+            for device in devices:
+                self.writers.append(DeviceWriter(device, baudrate, queue_size))
+        except Exception:
+            # The ports opened so far would leak otherwise
+            for writer in self.writers:
+                writer.stop()
+            raise
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.close()
+
+    def start(self):
+        for writer in self.writers:
+            writer.start()
+        return self
+
+    def send(self, payload) -> int:
+        started = time.monotonic()
+        frame = self._encoder.encode(payload)
+        duration = time.monotonic() - started
+        for writer in self.writers:
+            writer.stats.encode_time += duration
+            writer.put(frame)
+        return len(frame)
+
+    def stats(self):
+        return [writer.stats for writer in self.writers]
+
+    def report(self) -> str:
+        return '\n'.join(str(stats) for stats in self.stats())
+
+    def close(self):
+        for writer in self.writers:
+            writer.stop()
+        logger.info('Fan-out statistics:\n%s', self.report())
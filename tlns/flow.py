@@ -0,0 +1,201 @@
+import time
+import threading
+from collections import OrderedDict
+from logging import getLogger
+
+import tinyproto
+
+from tlns.link import DEFAULT_BAUDRATE, HdlcEncoder, LinkStats, open_serial
+
+logger = getLogger(__name__)
+
+# Device -> host messages, each one HDLC frame
+MSG_ACK = ord('A')      # 'A', seq: frame seq (and every frame sent before it) was taken by the panel
+MSG_READY = ord('R')    # 'R': panel has room in its frame buffer again
+MSG_BUSY = ord('B')     # 'B': panel frame buffer is full, hold on
+SEQ_MODULO = 256        # Host -> device frames are prefixed with one seq byte
+
+
+class LinkReceiver:
+    """Reads the device -> host direction of the link on its own thread and deframes it.
+    The serial port must be opened with a read timeout so the thread can be stopped."""
+    READ_TIMEOUT = 0.1
+
+    def __init__(self, ser, on_message):
+        self.bytes_received = 0
+        self._ser = ser
+        self._p = tinyproto.Hdlc()
+        self._p.on_read = on_message
+        self._p.begin()
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name='link_receiver', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._keep_going = False
+        self._thread.join()
+
+    def _run(self):
+        while self._keep_going:
+            data = self._ser.read(max(1, self._ser.in_waiting))
+            if data:
+                self.bytes_received += len(data)
+                self._p.rx(data)
+
+
+class InFlight:
+    def __init__(self, frame, sent_at):
+        self.frame = frame
+        self.sent_at = sent_at
+        self.resends = 0
+
+
+class FlowControlledSink:
+    """Credit based sender: at most window frames are in flight (sent, not acked yet) and nothing is sent
+    while the panel reports busy. Only the newest frame waits for a credit, older ones are dropped.
+    A frame not acked within ack_timeout is skipped if a newer frame is waiting, otherwise resent.
+    Busy ends with ready, with the next ack (the panel took a frame off its buffer) or after busy_timeout,
+    so a lost ready can't stall the sink: the next frame then probes the panel."""
+    WINDOW = 4
+    ACK_TIMEOUT = 0.25
+    BUSY_TIMEOUT = 1.0
+    MAX_RESENDS = 3
+    RTT_SMOOTHING = 0.125
+
+    def __init__(self, device, baudrate=DEFAULT_BAUDRATE, window=WINDOW, ack_timeout=ACK_TIMEOUT,
+                 busy_timeout=BUSY_TIMEOUT):
+        assert 0 < window < SEQ_MODULO // 2
+        self.window = window
+        self.ack_timeout = ack_timeout
+        self.busy_timeout = busy_timeout
+        self.busy_timeouts = 0
+        self.stats = LinkStats(device)
+        self.frames_acked = 0
+        self.frames_resent = 0
+        self.frames_lost = 0
+        self.rtt = None
+        self._ser = open_serial(device, baudrate, timeout=LinkReceiver.READ_TIMEOUT)
+        self._encoder = HdlcEncoder()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._in_flight = OrderedDict()
+        self._seq = 0
+        self._busy = False
+        self._busy_since = 0.0
+        self._keep_going = True
+        self._receiver = LinkReceiver(self._ser, self._on_message)
+        self._thread = threading.Thread(target=self._run, name='flow_sender', daemon=True)
+        self._receiver.start()
+        self._thread.start()
+
+    def send(self, payload) -> int:
+        with self._cond:
+            if self._pending is not None:
+                self.stats.frames_dropped += 1
+            self._pending = bytes(payload)
+            self._cond.notify()
+        return len(payload) + 1
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def _on_message(self, message):
+        if not message:
+            return
+        with self._cond:
+            if message[0] == MSG_ACK and len(message) > 1:
+                self._busy = False
+                self._on_ack(message[1])
+            elif message[0] == MSG_BUSY:
+                self._busy = True
+                self._busy_since = time.monotonic()
+            elif message[0] == MSG_READY:
+                self._busy = False
+            else:
+                logger.debug('Unknown message from device: %r', bytes(message))
+            self._cond.notify()
+
+    def _on_ack(self, seq):
+        # Acks are cumulative, a stale or duplicated one is ignored
+        if seq not in self._in_flight:
+            return
+        while self._in_flight:
+            acked_seq, entry = self._in_flight.popitem(last=False)
+            self.frames_acked += 1
+            if acked_seq == seq:
+                rtt = time.monotonic() - entry.sent_at
+                self.rtt = rtt if self.rtt is None else self.rtt + self.RTT_SMOOTHING * (rtt - self.rtt)
+                return
+
+    def _can_send(self, now):
+        if self._busy and now - self._busy_since >= self.busy_timeout:
+            self._busy = False
+            self.busy_timeouts += 1
+        return self._pending is not None and not self._busy and len(self._in_flight) < self.window
+
+    def _expired(self, now):
+        for seq, entry in self._in_flight.items():
+            if now - entry.sent_at >= self.ack_timeout:
+                return seq, entry
+        return None
+
+    def _wait_timeout(self, now):
+        deadlines = [entry.sent_at + self.ack_timeout for entry in self._in_flight.values()]
+        if self._busy and self._pending is not None:
+            deadlines.append(self._busy_since + self.busy_timeout)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - now)
+
+    def _next_frame(self):
+        """Called with the lock held, returns the next frame to write or None to wait"""
+        now = time.monotonic()
+        expired = self._expired(now)
+        if expired is not None:
+            seq, entry = expired
+            if self._pending is not None or entry.resends >= self.MAX_RESENDS:
+                del self._in_flight[seq]
+                self.frames_lost += 1
+                return None
+            entry.resends += 1
+            entry.sent_at = now
+            self.frames_resent += 1
+            return entry.frame
+        if not self._can_send(now):
+            self._cond.wait(self._wait_timeout(now))
+            return None
+        seq = self._seq
+        self._seq = (seq + 1) % SEQ_MODULO
+        started = time.monotonic()
+        frame = self._encoder.encode(bytes([seq]) + self._pending)
+        self.stats.encode_time += time.monotonic() - started
+        self._pending = None
+        self._in_flight[seq] = InFlight(frame, now)
+        return frame
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._keep_going:
+                    return
+                frame = self._next_frame()
+            if frame is None:
+                continue
+            started = time.monotonic()
+            self._ser.write(frame)
+            self.stats.on_write(len(frame), time.monotonic() - started)
+
+    def report(self) -> str:
+        return '{}, acked {}, resent {}, lost {}, busy timeouts {}, rtt {}'.format(
+            self.stats, self.frames_acked, self.frames_resent, self.frames_lost, self.busy_timeouts,
+            '{:.1f} ms'.format(self.rtt * 1e3) if self.rtt is not None else '-')
+
+    def close(self):
+        with self._cond:
+            self._keep_going = False
+            self._cond.notify()
+        self._thread.join()
+        self._receiver.stop()
+        self._ser.close()
@@ -0,0 +1,110 @@
+import time
+import argparse
+import threading
+from logging import getLogger
+
+from tlns.link import DEFAULT_BAUDRATE, LinkStats, wire_time
+
+logger = getLogger(__name__)
+
+
+class Governor:
+    """Sink wrapper pacing the frames to what the link behind sustains, whatever rate they are produced at.
+    Every write is timed and its encoded size taken, the cost of a frame is the longer of the write and its wire
+    time at the baudrate (a serial write often returns before the bytes are out), smoothed over the last frames.
+    A writer thread sends a frame every cost / headroom, so the link runs just below saturation and follows any
+    change of the frame size or of the link. A frame produced sooner replaces the one waiting (counted as
+    dropped) instead of queueing behind it: a frame waits one slot at most. The last frame is sent on close.
+    stats counts the frames handed on and dropped here, the link behind keeps its own."""
+    HEADROOM = 0.9
+    SMOOTHING = 0.2  # Weight of the newest frame in the cost average
+
+    def __init__(self, sink, baudrate=DEFAULT_BAUDRATE, headroom=HEADROOM, max_fps=None):
+        assert 0.0 < headroom <= 1.0
+        self.sink = sink
+        self.baudrate = baudrate
+        self.headroom = headroom
+        self.max_fps = max_fps
+        self.stats = LinkStats('governor')
+        self.frame_size = 0.0
+        self.frame_cost = 0.0
+        self._pending = None
+        self._cond = threading.Condition()
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name='governor', daemon=True)
+        self._thread.start()
+
+    def send(self, payload) -> int:
+        """Returns at once, payload is copied"""
+        with self._cond:
+            if self._pending is not None:
+                self.stats.frames_dropped += 1
+            self._pending = bytes(payload)
+            self._cond.notify()
+        return len(payload)
+
+    def interval(self) -> float:
+        """Seconds between two frames at the current link cost"""
+        interval = self.frame_cost / self.headroom
+        if self.max_fps:
+            interval = max(interval, 1.0 / self.max_fps)
+        return interval
+
+    def fps(self) -> float:
+        interval = self.interval()
+        return 1.0 / interval if interval else float('inf')
+
+    def _measure(self, size, duration):
+        cost = max(duration, wire_time(size, self.baudrate))
+        if self.stats.frames_sent:
+            self.frame_size += self.SMOOTHING * (size - self.frame_size)
+            self.frame_cost += self.SMOOTHING * (cost - self.frame_cost)
+        else:
+            self.frame_size, self.frame_cost = size, cost
+        self.stats.on_write(size, duration)
+
+    def _run(self):
+        next_at = time.monotonic()
+        while True:
+            with self._cond:
+                while self._keep_going and self._pending is None:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # Whatever came in while waiting for the slot goes out, not the frame that started the wait
+            with self._cond:
+                frame, self._pending = self._pending, None
+            started = time.monotonic()
+            size = self.sink.send(frame)
+            self._measure(size, time.monotonic() - started)
+            next_at = started + self.interval()
+
+    def report(self) -> str:
+        return '{}\ngovernor: {:.1f} fps, frame {:.0f} B costs {:.1f} ms, sent {}, dropped {}'.format(
+            self.sink.report(), self.fps(), self.frame_size, self.frame_cost * 1000, self.stats.frames_sent,
+            self.stats.frames_dropped)
+
+    def close(self):
+        with self._cond:
+            self._keep_going = False
+            self._cond.notify()
+        self._thread.join()
+        self.sink.close()
+
+
+def parse_headroom(text) -> float:
+    """argparse type of the governor headroom, the part of the link time it may use"""
+    headroom = float(text)
+    if not 0.0 < headroom <= 1.0:
+        raise argparse.ArgumentTypeError('headroom {} out of (0, 1]'.format(headroom))
+    return headroom
+
+
+def parse_fps(text) -> float:
+    fps = float(text)
+    if fps <= 0:
+        raise argparse.ArgumentTypeError('frame rate {} is not positive'.format(fps))
+    return fps
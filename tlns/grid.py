@@ -0,0 +1,71 @@
+from bitarray import bitarray
+
+from tlns.tlns import Board
+
+
+class CellSet:
+    """Set of board cells backed by a bitmap (one bit per cell, indexed x * h + y).
+    Membership and insertion are O(1), iteration follows the insertion order."""
+
+    def __init__(self, w=Board.WIDTH, h=Board.HEIGHT):
+        self.w = w
+        self.h = h
+        self._bits = bitarray(w * h)
+        self._bits.setall(0)
+        self._order = []
+
+    def in_bounds(self, x, y) -> bool:
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def add(self, x, y) -> bool:
+        """Returns True if the cell was not in the set before"""
+        assert self.in_bounds(x, y)
+        idx = x * self.h + y
+        if self._bits[idx]:
+            return False
+        self._bits[idx] = 1
+        self._order.append((x, y))
+        return True
+
+    def __contains__(self, cell) -> bool:
+        x, y = cell
+        return self.in_bounds(x, y) and bool(self._bits[x * self.h + y])
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def clear(self):
+        self._bits.setall(0)
+        self._order = []
+
+
+class CellMap:
+    """Items bucketed by the board cell they fall into"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._len = 0
+
+    def add(self, x, y, item):
+        self._buckets.setdefault((x, y), []).append(item)
+        self._len += 1
+
+    def get(self, x, y) -> list:
+        return self._buckets.get((x, y), [])
+
+    def __contains__(self, cell) -> bool:
+        return cell in self._buckets
+
+    def __iter__(self):
+        for items in self._buckets.values():
+            yield from items
+
+    def __len__(self):
+        return self._len
+
+    def clear(self):
+        self._buckets = {}
+        self._len = 0
@@ -0,0 +1,70 @@
+import math
+import time
+from collections import namedtuple
+
+EVENT_MOVE = 'move'
+EVENT_PRESS = 'press'
+EVENTS = (EVENT_MOVE, EVENT_PRESS)
+
+# Same values as Qt.LeftButton / Qt.RightButton
+BUTTON_LEFT = 1
+BUTTON_RIGHT = 2
+
+HEADER = '# tlns input: seconds since start, event, x, y, buttons\n'
+
+InputEvent = namedtuple('InputEvent', 't kind x y buttons')
+
+
+class InputRecorder:
+    """Writes mouse events with their time since the recorder was created, one per line"""
+
+    def __init__(self, path):
+        self._f = open(path, 'w')
+        self._f.write(HEADER)
+        self._started = time.monotonic()
+        self.events = 0
+
+    def record(self, kind, x, y, buttons=0):
+        self._f.write('{:.6f} {} {} {} {}\n'.format(time.monotonic() - self._started, kind, x, y, buttons))
+        self.events += 1
+
+    def move(self, x, y):
+        self.record(EVENT_MOVE, x, y)
+
+    def press(self, x, y, buttons):
+        self.record(EVENT_PRESS, x, y, buttons)
+
+    def close(self):
+        self._f.close()
+
+
+def read_events(path) -> list:
+    events = []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip() or line.startswith('#'):
+                continue
+            try:
+                t, kind, x, y, buttons = line.split()
+                event = InputEvent(float(t), kind, int(x), int(y), int(buttons))
+            except ValueError:
+                raise ValueError('{}:{}: malformed event {!r}'.format(path, n, line.rstrip())) from None
+            if kind not in EVENTS:
+                raise ValueError('{}:{}: unknown event {}'.format(path, n, kind))
+            events.append(event)
+    return events
+
+
+def synthetic_events(count, w, h, rate=100, click_every=50, clear_every=20) -> list:
+    """A reproducible session without a human: count moves at rate per second along a Lissajous curve over
+    a w x h window, a left click every click_every moves and a right click instead every clear_every clicks"""
+    events = []
+    for n in range(1, count + 1):
+        t = n / rate
+        x = int((math.sin(0.03 * n) + 1) / 2 * (w - 1))
+        y = int((math.sin(0.04 * n + 1) + 1) / 2 * (h - 1))
+        events.append(InputEvent(t, EVENT_MOVE, x, y, 0))
+        if n % click_every == 0:
+            button = BUTTON_RIGHT if n % (click_every * clear_every) == 0 else BUTTON_LEFT
+            events.append(InputEvent(t, EVENT_PRESS, x, y, button))
+    return events
@@ -0,0 +1,192 @@
+import time
+from logging import getLogger
+
+import serial
+import tinyproto
+
+logger = getLogger(__name__)
+
+DEFAULT_BAUDRATE = 115200
+BITS_PER_BYTE = 10  # 8N1: start + 8 data + stop
+
+
+def wire_time(size, baudrate=DEFAULT_BAUDRATE) -> float:
+    """Seconds it takes to clock size bytes out of the UART"""
+    return size * BITS_PER_BYTE / baudrate
+
+
+def open_serial(device, baudrate=DEFAULT_BAUDRATE, timeout=None):
+    """Device may be a path or any pyserial URL (e.g. 'loop://')"""
+    return serial.serial_for_url(device, baudrate=baudrate, bytesize=8, parity='N', stopbits=1, timeout=timeout)
+
+
+class HdlcEncoder:
+    def __init__(self):
+        self._p = tinyproto.Hdlc()
+        self._p.begin()
+
+    def encode(self, payload) -> bytes:
+        self._p.put(payload)
+        return self._p.tx()
+
+
+class LinkStats:
+    RATE_WINDOW = 1.0  # s, recent_fps() is the frame rate over the last window
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.monotonic()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.write_time = 0.0
+        self.encode_time = 0.0
+        self._window = (self.started, 0)  # Start and frames_sent at the start of the current window
+        self._window_fps = None
+
+    def on_write(self, size, duration):
+        self.on_frame()
+        self.bytes_sent += size
+        self.write_time += duration
+
+    def on_frame(self):
+        """Counts a frame sent, closing the rate window once it is RATE_WINDOW long"""
+        self.frames_sent += 1
+        now = time.monotonic()
+        started, frames = self._window
+        if now - started >= self.RATE_WINDOW:
+            self._window_fps = (self.frames_sent - frames) / (now - started)
+            self._window = (now, self.frames_sent)
+
+    def fps(self) -> float:
+        return self.frames_sent / max(time.monotonic() - self.started, 1e-9)
+
+    def recent_fps(self) -> float:
+        """Rate of the last full window. Before the first one, or if no frame has closed the current one (the link
+        stalls), the rate of the current window so far. Reading it changes nothing."""
+        started, frames = self._window
+        elapsed = time.monotonic() - started
+        if self._window_fps is None or elapsed >= self.RATE_WINDOW:
+            return (self.frames_sent - frames) / max(elapsed, 1e-9)
+        return self._window_fps
+
+    def throughput(self) -> float:
+        return self.bytes_sent / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self):
+        return '{}: sent {} ({:.1f} fps, {:.0f} B/s), dropped {}, busy {:.2f} s'.format(
+            self.name, self.frames_sent, self.fps(), self.throughput(), self.frames_dropped, self.write_time)
+
+
+class SerialSink:
+    """Encodes frames with HDLC and writes them to a single device from the caller thread"""
+
+    def __init__(self, device, baudrate=DEFAULT_BAUDRATE):
+        self._ser = open_serial(device, baudrate)
+        self._encoder = HdlcEncoder()
+        self.stats = LinkStats(device)
+
+    def send(self, payload) -> int:
+        """Returns the number of bytes put on the wire"""
+        started = time.monotonic()
+        frame = self._encoder.encode(payload)
+        encoded = time.monotonic()
+        self._ser.write(frame)
+        self.stats.encode_time += encoded - started
+        self.stats.on_write(len(frame), time.monotonic() - encoded)
+        return len(frame)
+
+    def report(self) -> str:
+        return str(self.stats)
+
+    def close(self):
+        self._ser.close()
+
+
+def open_sink(devices, baudrate=DEFAULT_BAUDRATE, broker=None, priority=0, window=None, fd_window=None,
+              retry_timeout=None, address=None, device_sink=SerialSink):
+    """Returns a sink with send(payload)/report()/close() for one or several (mirrored) devices,
+    or for the frame broker owning them if broker address is given.
+    With window the device is driven with acks and credit based flow control,
+    with fd_window through the reliable tinyproto full duplex transport,
+    with address to the panel of that address on a tlns.bus line.
+    A single device without any of them is opened with device_sink(device, baudrate)."""
+    if broker:
+        from tlns.broker import BrokerClient
+        return BrokerClient(broker, priority)
+
+    if (window or fd_window or address is not None) and len(devices) != 1:
+        raise ValueError('Flow control, reliable transport and bus addressing need exactly one device')
+
+    if address is not None:
+        if window or fd_window:
+            raise ValueError('Bus addressing goes without flow control and reliable transport')
+        from tlns.bus import BusScheduler
+        return BusScheduler(devices[0], baudrate).panel(address)
+
+    if window:
+        from tlns.flow import FlowControlledSink
+        return FlowControlledSink(devices[0], baudrate, window)
+
+    if fd_window:
+        from tlns.transport import FdSink
+        return FdSink(devices[0], baudrate, fd_window, retry_timeout=retry_timeout or FdSink.RETRY_TIMEOUT)
+
+    if len(devices) == 1:
+        return device_sink(devices[0], baudrate)
+
+    from tlns.fanout import FanoutSink
+    return FanoutSink(devices, baudrate).start()
+
+
+def add_sink_arguments(parser):
+    """Link options shared by the scripts, the parsed arguments go to open_sink_from_args()"""
+    from tlns.broker import DEFAULT_ADDRESS, parse_priority
+    from tlns.flow import FlowControlledSink
+    from tlns.transport import FdSink
+    from tlns.output import DEFAULT_DITHER
+    from tlns.governor import Governor, parse_headroom, parse_fps
+
+    parser.add_argument('--broker', help='Publish frames to the frame broker (socket path or host:port) '
+                        'instead of opening the device', dest='broker', nargs='?', const=DEFAULT_ADDRESS)
+    parser.add_argument('--priority', help='Priority of the frames published to the broker, 0..255',
+                        dest='priority', type=parse_priority, default=0)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--flow-control', help='Wait for device acks, keep at most K frames in flight',
+                       dest='window', type=int, nargs='?', const=FlowControlledSink.WINDOW, metavar='K')
+    group.add_argument('--reliable', help='Use tinyproto full duplex transport with a window of W frames',
+                       dest='fd_window', type=int, nargs='?', const=FdSink.WINDOW, metavar='W')
+    parser.add_argument('--bus-address', help='Address of the panel on a shared bus line (tlns.bus)',
+                        dest='bus_address', type=int)
+    parser.add_argument('--retry-timeout', help='Reliable transport retransmission timeout, s',
+                        dest='retry_timeout', type=float, default=FdSink.RETRY_TIMEOUT)
+    parser.add_argument('--calibration', help='TOML file with the [output] parameters of the panel',
+                        dest='calibration')
+    parser.add_argument('--gamma', help='Gamma applied to pixel values', dest='gamma', type=float)
+    parser.add_argument('--dim', help='Global dimming factor, 0..1', dest='dim', type=float)
+    parser.add_argument('--dither', help='Temporal dithering over N frames', dest='dither', type=int, nargs='?',
+                        const=DEFAULT_DITHER, metavar='N')
+    parser.add_argument('--governor', help='Pace frames to the measured link cost, keeping the link busy at most '
+                        'HEADROOM (0..1] of the time and dropping the frames produced faster', dest='governor',
+                        type=parse_headroom, nargs='?', const=Governor.HEADROOM, metavar='HEADROOM')
+    parser.add_argument('--max-fps', help='Frame rate cap of the governor', dest='max_fps', type=parse_fps)
+
+
+def open_sink_from_args(devices, args, baudrate=DEFAULT_BAUDRATE, device_sink=SerialSink):
+    """The sink is wrapped in a tlns.output.OutputStage when calibration, gamma, dimming or dithering is asked for,
+    and in a tlns.governor.Governor with --governor. device_sink goes to open_sink()."""
+    sink = open_sink(devices, baudrate, broker=args.broker, priority=args.priority, window=args.window,
+                     fd_window=args.fd_window, retry_timeout=args.retry_timeout, address=args.bus_address,
+                     device_sink=device_sink)
+    from tlns.output import OutputStage, load_calibration
+
+    params = load_calibration(args.calibration) if args.calibration else {}
+    for name in ('gamma', 'dim', 'dither'):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    if params:
+        sink = OutputStage(sink, baudrate=baudrate, **params)
+    if args.governor is not None:
+        from tlns.governor import Governor
+        sink = Governor(sink, baudrate, args.governor, args.max_fps)
+    return sink
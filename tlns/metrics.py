@@ -0,0 +1,238 @@
+import os
+import time
+import socket
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler
+from logging import getLogger
+
+from tlns.link import LinkStats
+
+logger = getLogger(__name__)
+
+DEFAULT_METRICS_ADDRESS = 'localhost:9464'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+
+
+class Metric:
+    """Counter or gauge with fixed labels. Updating it is a plain attribute update, it is only read on a scrape."""
+    __slots__ = ('name', 'kind', 'help', 'labels', 'value')
+
+    def __init__(self, name, kind, help_, labels):
+        self.name = name
+        self.kind = kind
+        self.help = help_
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in sorted(labels.items())) + '}'
+
+
+class Registry:
+    """Metrics updated by their owners plus collectors, callables yielding (name, kind, help, labels, value)
+    that are only called on a scrape: a sink keeping its own statistics costs nothing extra on the send path."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _metric(self, kind, name, help_, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, Metric(name, kind, help_, labels))
+        assert metric.kind == kind
+        return metric
+
+    def counter(self, name, help_='', **labels) -> Metric:
+        return self._metric(COUNTER, name, help_, labels)
+
+    def gauge(self, name, help_='', **labels) -> Metric:
+        return self._metric(GAUGE, name, help_, labels)
+
+    def add_collector(self, collect):
+        with self._lock:
+            self._collectors.append(collect)
+
+    def remove_collector(self, collect):
+        with self._lock:
+            self._collectors.remove(collect)
+
+    def samples(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            yield metric.name, metric.kind, metric.help, metric.labels, metric.value
+        for collect in collectors:
+            yield from collect()
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        families = {}
+        for name, kind, help_, labels, value in self.samples():
+            family = families.setdefault(name, ['# HELP {} {}'.format(name, help_), '# TYPE {} {}'.format(name, kind)])
+            family.append('{}{} {}'.format(name, format_labels(labels), float(value)))
+        return ''.join(line + '\n' for family in families.values() for line in family)
+
+
+REGISTRY = Registry()
+
+
+def link_stats(sink):
+    """(LinkStats, queue depth getter or None) of a sink and of everything behind it: wrappers keeping their own
+    stats (tlns.governor.Governor) and the devices, through fan-outs"""
+    found = []
+    while True:
+        writers = getattr(sink, 'writers', None)
+        stats = getattr(sink, 'stats', None)
+        if writers is not None:
+            found.extend((writer.stats, writer.queue_depth) for writer in writers)
+        elif isinstance(stats, LinkStats):
+            found.append((stats, getattr(sink, 'in_flight', None)))
+        if not hasattr(sink, 'sink'):
+            return found
+        sink = sink.sink
+
+
+def governor_samples(sink):
+    """Pacing of the governors in front of the link"""
+    while hasattr(sink, 'sink'):
+        if hasattr(sink, 'frame_cost'):
+            labels = {'link': sink.stats.name}
+            yield 'tlns_governor_fps', GAUGE, 'Frame rate the governor paces to', labels, sink.fps()
+            yield ('tlns_governor_frame_cost_seconds', GAUGE, 'Smoothed link time of a frame', labels,
+                   sink.frame_cost)
+        sink = sink.sink
+
+
+class MeteredSink:
+    """Sink wrapper publishing the link to a Registry. Frames produced and the time spent in send() are counted
+    here, everything the sinks behind already count (sent, dropped, bytes, write and encode time, queue depth)
+    is read from their LinkStats on a scrape. The achieved FPS is LinkStats.recent_fps(): a scrape changes no state,
+    any number of scrapers see the same rate."""
+
+    def __init__(self, sink, registry=REGISTRY, server=None):
+        self.sink = sink
+        self.registry = registry
+        self.server = server
+        self.frames_produced = 0
+        self.send_time = 0.0
+        registry.add_collector(self.collect)
+
+    def send(self, payload) -> int:
+        started = time.monotonic()
+        size = self.sink.send(payload)
+        self.send_time += time.monotonic() - started
+        self.frames_produced += 1
+        return size
+
+    def collect(self):
+        yield 'tlns_frames_produced_total', COUNTER, 'Frames handed to the sink', {}, self.frames_produced
+        yield 'tlns_send_seconds_total', COUNTER, 'Time spent in the sink send()', {}, self.send_time
+        for stats, queue_depth in link_stats(self.sink):
+            labels = {'link': stats.name}
+            yield 'tlns_frames_sent_total', COUNTER, 'Frames written to the device', labels, stats.frames_sent
+            yield ('tlns_frames_dropped_total', COUNTER, 'Frames dropped or coalesced before the device', labels,
+                   stats.frames_dropped)
+            yield 'tlns_bytes_sent_total', COUNTER, 'Bytes written to the device', labels, stats.bytes_sent
+            yield 'tlns_write_seconds_total', COUNTER, 'Time spent writing to the device', labels, stats.write_time
+            yield 'tlns_encode_seconds_total', COUNTER, 'Time spent encoding frames', labels, stats.encode_time
+            yield ('tlns_fps', GAUGE, 'Frames written per second over the last {:g} s'.format(stats.RATE_WINDOW),
+                   labels, stats.recent_fps())
+            if queue_depth is not None:
+                yield 'tlns_queue_depth', GAUGE, 'Frames queued or in flight', labels, queue_depth()
+        yield from governor_samples(self.sink)
+
+    def report(self) -> str:
+        return self.sink.report()
+
+    def close(self):
+        if self.server:
+            self.server.stop()
+        self.registry.remove_collector(self.collect)
+        self.sink.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return str(self.client_address)
+
+    def log_message(self, format, *args):
+        logger.debug('metrics: ' + format, *args)
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serves the registry over HTTP (any path) on a local 'host:port' or a Unix socket path, from a thread"""
+
+    def __init__(self, address=DEFAULT_METRICS_ADDRESS, registry=REGISTRY):
+        from tlns.broker import parse_address
+
+        self.address = address
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.unlink(addr)
+            self._server = _UnixServer(addr, _Handler)
+        else:
+            self._server = _TcpServer(addr, _Handler)
+        self._server.registry = registry
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info('Metrics on %s', self.address)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics', help='Serve link metrics in Prometheus text format on host:port or a Unix '
+                        'socket path', dest='metrics', nargs='?', const=DEFAULT_METRICS_ADDRESS, metavar='ADDRESS')
+
+
+def metrics_from_args(args, sink):
+    """The sink as is, or wrapped in a MeteredSink serving the metrics if asked for (closing it stops the server)"""
+    if not args.metrics:
+        return sink
+    return MeteredSink(sink, server=MetricsServer(args.metrics).start())
@@ -0,0 +1,120 @@
+import sys
+import logging
+import threading
+
+from tlns.tlns import Board, BOARD_GLYPHS
+
+MONITOR_FPS = 10
+LOG_LEVELS = (logging.WARNING, logging.INFO, logging.DEBUG)
+
+CSI = '\x1b['
+HIDE_CURSOR = CSI + '?25l'
+SHOW_CURSOR = CSI + '?25h'
+CLEAR_SCREEN = CSI + '2J'
+
+
+def move_to(row, column) -> str:
+    """1-based like the terminal"""
+    return '{}{};{}H'.format(CSI, row, column)
+
+
+class Monitor:
+    """Live terminal view of the frames being sent. show() only keeps a reference to the latest frame, a thread
+    redraws at most fps times a second and only rewrites the cells that changed since the last redraw (with
+    ANSI cursor addressing), so a sender at any frame rate costs the terminal a bounded amount of output."""
+    LABEL_WIDTH = 4  # 'NN: '
+
+    def __init__(self, w_=None, h_=None, fps=MONITOR_FPS, stream=None):
+        self.w = w_ if w_ else Board.WIDTH
+        self.h = h_ if h_ else Board.HEIGHT
+        self.period = 1.0 / fps
+        self.stream = stream if stream is not None else sys.stdout
+        self.frames = 0
+        self.redraws = 0
+        self.cells_written = 0
+        self._frame = None
+        self._shown = None
+        self._frames_shown = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='monitor', daemon=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def show(self, board: Board):
+        self._frame = bytes(board.pix)
+        self.frames += 1
+
+    def _run(self):
+        out = [HIDE_CURSOR, CLEAR_SCREEN]
+        for y in range(self.h):
+            out.append(move_to(self._row(y), 1) + '{:>2}: '.format(y))
+        self._write(out)
+        while not self._stop.wait(self.period):
+            self._redraw()
+        self._redraw()
+        self._write([move_to(self.h + 2, 1), SHOW_CURSOR])
+
+    def _row(self, y):
+        return self.h - y
+
+    def _redraw(self):
+        frame, shown, frames = self._frame, self._shown, self.frames
+        if frames == self._frames_shown:
+            return
+        out = []
+        if frame != shown:
+            if shown is None:
+                changed = range(len(frame))
+            else:
+                changed = [i for i, (new, old) in enumerate(zip(frame, shown)) if new != old]
+            # In screen order, so a run of changed cells in a row needs one cursor move
+            changed = sorted(changed, key=lambda i: (self.h - i % self.h, i // self.h))
+            cursor = None
+            for i in changed:
+                position = (self._row(i % self.h), self.LABEL_WIDTH + i // self.h + 1)
+                if position != cursor:
+                    out.append(move_to(*position))
+                out.append(chr(BOARD_GLYPHS[frame[i]]))
+                cursor = position[0], position[1] + 1
+            self._shown = frame
+            self.redraws += 1
+            self.cells_written += len(changed)
+        out.append(move_to(self.h + 1, 1) + 'frames {}, redraws {}{}K'.format(frames, self.redraws, CSI))
+        self._write(out)
+        self._frames_shown = frames
+
+    def _write(self, out):
+        self.stream.write(''.join(out))
+        self.stream.flush()
+
+    def report(self) -> str:
+        return 'monitor: frames {}, redraws {}, cells written {}'.format(self.frames, self.redraws,
+                                                                        self.cells_written)
+
+
+def add_monitor_arguments(parser):
+    """Terminal output options shared by the scripts, the parsed arguments go to monitor_from_args()"""
+    parser.add_argument('--monitor', help='Live view of the sent frames in the terminal, redrawn FPS times a second',
+                        dest='monitor', type=float, nargs='?', const=MONITOR_FPS, metavar='FPS')
+    parser.add_argument('-v', '--verbose', help='More log output, -vv logs every frame', dest='verbose',
+                        action='count', default=0)
+
+
+def monitor_from_args(args, w_=None, h_=None):
+    """Sets up logging by the verbosity, returns a started Monitor or None"""
+    logging.basicConfig(level=LOG_LEVELS[min(args.verbose, len(LOG_LEVELS) - 1)], format='%(message)s')
+    if not args.monitor:
+        return None
+    return Monitor(w_, h_, args.monitor).start()
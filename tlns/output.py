@@ -0,0 +1,133 @@
+import time
+import threading
+
+from tlns.link import DEFAULT_BAUDRATE, wire_time
+
+DEFAULT_GAMMA = 1.0
+DEFAULT_LEVELS = 256
+DEFAULT_DITHER = 4
+CALIBRATION_TABLE = 'output'
+
+
+def van_der_corput(n) -> float:
+    reversed_bits, denominator = 0.0, 1.0
+    while n:
+        denominator *= 2
+        reversed_bits += (n & 1) / denominator
+        n >>= 1
+    return reversed_bits
+
+
+def dither_thresholds(phases) -> list:
+    """Threshold of every phase: each of (k + 0.5) / phases once, so a level between two steps shows the upper
+    one in its exact share of the phases for any number of them. They are handed out in van der Corput order,
+    so the frames showing the upper level are spread over the cycle."""
+    order = sorted(range(phases), key=van_der_corput)
+    thresholds = [0.0] * phases
+    for rank, phase in enumerate(order):
+        thresholds[phase] = (rank + 0.5) / phases
+    return thresholds
+
+
+def build_luts(gamma=DEFAULT_GAMMA, levels=DEFAULT_LEVELS, floor=0, ceiling=0xFF, dim=1.0, phases=0) -> tuple:
+    """Returns one 256 byte translation table per dither phase (a single one without dithering).
+    A pixel value v asks for (v / 255) ** gamma * dim of the full light. The panel shows levels real steps,
+    step k > 0 is driven with the code floor + (ceiling - floor) * k / (levels - 1), floor being the highest
+    code which is still dark. Light between two steps is made by showing the upper one in a fraction of phases."""
+    assert 1 < levels <= 256
+    assert 0 <= floor < ceiling <= 0xFF
+    assert 0.0 <= dim <= 1.0
+
+    def code(step):
+        return 0 if step == 0 else round(floor + (ceiling - floor) * step / (levels - 1))
+
+    steps = [(value / 0xFF) ** gamma * dim * (levels - 1) for value in range(256)]
+    if not phases:
+        return (bytes(code(round(step)) for step in steps),)
+    luts = []
+    for threshold in dither_thresholds(phases):
+        luts.append(bytes(code(min(int(step) + (step - int(step) > threshold), levels - 1)) for step in steps))
+    return tuple(luts)
+
+
+def load_calibration(path) -> dict:
+    """Reads the output stage parameters of a panel from the [output] table of a TOML file"""
+    import toml
+
+    params = toml.load(path).get(CALIBRATION_TABLE, {})
+    unknown = set(params) - {'gamma', 'levels', 'floor', 'ceiling', 'dim', 'dither'}
+    if unknown:
+        raise ValueError('Unknown calibration parameters in {}: {}'.format(path, ', '.join(sorted(unknown))))
+    return params
+
+
+class OutputStage:
+    """Sink wrapper mapping pixel values to panel codes with the translation tables of build_luts().
+    Each frame costs a single bytes.translate, which makes the only allocation: the frame handed to the sink.
+    With dithering every frame sent uses the next phase, and the last frame is resent at the link rate
+    while nothing new comes, so a still picture keeps its intermediate levels."""
+
+    def __init__(self, sink, gamma=DEFAULT_GAMMA, levels=DEFAULT_LEVELS, floor=0, ceiling=0xFF, dim=1.0, dither=0,
+                 baudrate=DEFAULT_BAUDRATE, refresh=True):
+        self.sink = sink
+        self.gamma = gamma
+        self.levels = levels
+        self.floor = floor
+        self.ceiling = ceiling
+        self.dim = dim
+        self.dither = dither
+        self.baudrate = baudrate
+        self.refreshes = 0
+        self._luts = build_luts(gamma, levels, floor, ceiling, dim, dither)
+        self._phase = 0
+        self._source = None
+        self._last_sent = 0.0
+        self._period = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if dither and refresh:
+            self._thread = threading.Thread(target=self._run, name='output_refresh', daemon=True)
+            self._thread.start()
+
+    def set_dim(self, dim):
+        luts = build_luts(self.gamma, self.levels, self.floor, self.ceiling, dim, self.dither)
+        with self._lock:
+            self.dim = dim
+            self._luts = luts
+
+    def send(self, payload) -> int:
+        """payload is bytes or bytearray, it is kept (not copied) for the refresh. A memoryview (e.g. the
+        pixels of a tlns.text.Ticker board) is turned into bytes for translate(), the frame is a new one anyway."""
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()
+        with self._lock:
+            self._source = payload
+            if self._period is None:
+                # Roughly the frame rate the link sustains: payload plus HDLC flags and CRC
+                self._period = wire_time(len(payload) + 4, self.baudrate)
+            return self._write(payload)
+
+    def _write(self, payload) -> int:
+        frame = payload.translate(self._luts[self._phase])
+        self._phase = (self._phase + 1) % len(self._luts)
+        self._last_sent = time.monotonic()
+        return self.sink.send(frame)
+
+    def _run(self):
+        while not self._stopped.wait(self._period or 0.01):
+            with self._lock:
+                if self._source is None or time.monotonic() - self._last_sent < self._period:
+                    continue
+                self._write(self._source)
+                self.refreshes += 1
+
+    def report(self) -> str:
+        return '{}\noutput: gamma {}, levels {}, dim {}, dither {}, refreshes {}'.format(
+            self.sink.report(), self.gamma, self.levels, self.dim, self.dither or 'off', self.refreshes)
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.sink.close()
@@ -0,0 +1,239 @@
+import os
+import glob
+import time
+import queue
+import threading
+from logging import getLogger
+
+import numpy as np
+
+from tlns.tlns import Board, PIXEL_MAX_BRIGHTNESS
+
+logger = getLogger(__name__)
+
+PREFETCH_DEPTH = 8
+PGM_MAGIC = b'P5'
+
+
+def to_uint8(frame):
+    """Integer frames above 8 bit keep their high byte, float frames are taken as 0..1.
+    Colour frames are averaged over their channels in their own type."""
+    if frame.ndim == 3:
+        frame = frame.mean(axis=2).astype(frame.dtype)
+    if frame.dtype == np.uint8:
+        return frame
+    if np.issubdtype(frame.dtype, np.floating):
+        return (np.clip(frame, 0.0, 1.0) * PIXEL_MAX_BRIGHTNESS).astype(np.uint8)
+    if frame.dtype.itemsize > 1:
+        return (frame >> (8 * frame.dtype.itemsize - 8)).astype(np.uint8)
+    return frame.astype(np.uint8)
+
+
+def read_raw(path, width, height):
+    """8 bit grayscale frames of width * height bytes back to back"""
+    size = width * height
+    with open(path, 'rb') as f:
+        while True:
+            frame = np.fromfile(f, np.uint8, size)
+            if len(frame) < size:
+                return
+            yield frame.reshape(height, width)
+
+
+def _pgm_token(f):
+    token = b''
+    while True:
+        c = f.read(1)
+        if not c:
+            return token
+        if c == b'#':
+            f.readline()
+        elif c.isspace():
+            if token:
+                return token
+        else:
+            token += c
+
+
+def read_pgm(path):
+    """Binary (P5) PGM images, a file may hold several of them back to back"""
+    with open(path, 'rb') as f:
+        while True:
+            magic = _pgm_token(f)
+            if not magic:
+                return
+            if magic != PGM_MAGIC:
+                raise ValueError('{}: not a binary PGM ({!r})'.format(path, magic))
+            width, height, maxval = (int(_pgm_token(f)) for _ in range(3))
+            dtype = np.uint8 if maxval < 256 else np.dtype('>u2')
+            frame = np.fromfile(f, dtype, width * height)
+            if len(frame) < width * height:
+                raise ValueError('{}: truncated image'.format(path))
+            yield to_uint8(frame.reshape(height, width))
+
+
+def read_npy(path):
+    """(h, w) image, (n, h, w) sequence or (n, h, w, channels) color sequence, memory mapped"""
+    frames = np.load(path, mmap_mode='r')
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+    for frame in frames:
+        yield to_uint8(np.asarray(frame))
+
+
+def open_frames(path, width=None, height=None):
+    """Frame generator for a .npy, .pgm or raw file, or a directory / glob pattern of those (sorted)"""
+    if os.path.isdir(path):
+        path = os.path.join(path, '*')
+    if glob.has_magic(path):
+        return (frame for name in sorted(glob.glob(path)) for frame in open_frames(name, width, height))
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return read_npy(path)
+    if extension in ('.pgm', '.pnm'):
+        return read_pgm(path)
+    if not (width and height):
+        raise ValueError('{}: raw input needs the frame size'.format(path))
+    return read_raw(path, width, height)
+
+
+class Prefetcher:
+    """Runs a frame generator on a reader thread, at most depth frames are read ahead"""
+    _END = object()
+
+    def __init__(self, frames, depth=PREFETCH_DEPTH):
+        self._frames = frames
+        self._queue = queue.Queue(maxsize=depth)
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name='frame_reader', daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while self._keep_going:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run(self):
+        try:
+            for frame in self._frames:
+                if not self._keep_going:
+                    return
+                self._put(frame)
+        except Exception as ex:
+            self._put(ex)
+        self._put(self._END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self._keep_going = False
+        self._thread.join()
+
+
+class AreaScaler:
+    """Scales frames to w x h by averaging the source pixels falling in every target pixel
+    (nearest pixel along an axis the source is smaller in). The cell bounds are computed once per source size."""
+
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self._shape = None
+
+    @staticmethod
+    def _bounds(size, out):
+        starts = np.arange(out) * size // out
+        ends = (np.arange(out) + 1) * size // out
+        return starts, np.maximum(ends - starts, 1)
+
+    def __call__(self, frame):
+        if frame.shape != self._shape:
+            self._shape = frame.shape
+            self._rows, row_counts = self._bounds(frame.shape[0], self.h)
+            self._cols, col_counts = self._bounds(frame.shape[1], self.w)
+            self._areas = np.outer(row_counts, col_counts)
+        sums = np.add.reduceat(np.add.reduceat(frame, self._rows, axis=0, dtype=np.uint32), self._cols, axis=1)
+        return (sums // self._areas).astype(np.uint8)
+
+
+def threshold_lut(level):
+    lut = np.zeros(256, np.uint8)
+    lut[level:] = PIXEL_MAX_BRIGHTNESS
+    return lut
+
+
+def palette_lut(palette):
+    """Maps every value to the nearest palette entry"""
+    palette = np.array(sorted(palette), np.int32)
+    nearest = np.abs(np.arange(256)[:, np.newaxis] - palette[np.newaxis, :]).argmin(axis=1)
+    return palette[nearest].astype(np.uint8)
+
+
+class PlaybackStats:
+    def __init__(self):
+        self.frames_read = 0
+        self.frames_shown = 0
+        self.frames_dropped = 0
+        self.started = time.monotonic()
+
+    def __str__(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return 'read {}, shown {} ({:.1f} fps), dropped {}'.format(
+            self.frames_read, self.frames_shown, self.frames_shown / elapsed, self.frames_dropped)
+
+
+def paced(frames, fps, stats):
+    """Yields frames at fps, a frame whose slot has already passed is dropped before any work is done on it"""
+    period = 1.0 / fps
+    started = time.monotonic()
+    for n, frame in enumerate(frames):
+        stats.frames_read += 1
+        due = started + n * period
+        delay = due - time.monotonic()
+        if delay < -period:
+            stats.frames_dropped += 1
+            continue
+        if delay > 0:
+            time.sleep(delay)
+        yield frame
+
+
+def render(frames, board: Board, scaler, lut=None, flip_x=False, flip_y=False):
+    """Scales and quantizes every frame straight into board.pix, yields the board"""
+    # board.pix[x * h + y] is the pixel at column x, row y
+    pixels = np.frombuffer(board.pix, np.uint8).reshape(board.w, board.h)
+    for frame in frames:
+        image = scaler(frame)
+        if flip_x:
+            image = image[:, ::-1]
+        if flip_y:
+            image = image[::-1]
+        if lut is not None:
+            np.take(lut, image.T, out=pixels)
+        else:
+            pixels[...] = image.T
+        yield board
+
+
+def play(frames, sink, fps, lut=None, flip_x=False, flip_y=False, prefetch=PREFETCH_DEPTH, board=None) -> PlaybackStats:
+    """Reads, paces, scales, quantizes and sends frames until the input ends. Memory use does not depend on
+    the input length: frames are read on demand and at most prefetch of them are held."""
+    board = board if board is not None else Board()
+    stats = PlaybackStats()
+    reader = Prefetcher(frames, prefetch)
+    try:
+        for board in render(paced(reader, fps, stats), board, AreaScaler(board.w, board.h), lut, flip_x, flip_y):
+            sink.send(board.__bytes__())
+            stats.frames_shown += 1
+    finally:
+        reader.close()
+    return stats
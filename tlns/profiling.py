@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+import signal
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+DEFAULT_PREFIX = 'tlns_profile'
+SAMPLING_INTERVAL = 0.005
+TRACEMALLOC_FRAMES = 10
+ALLOC_TOP = 25
+
+
+class TimingCounter:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.calls += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def __str__(self):
+        return '{}: {} calls, total {:.3f} s, mean {:.1f} us, max {:.1f} us'.format(
+            self.name, self.calls, self.total, self.total / max(self.calls, 1) * 1e6, self.max * 1e6)
+
+
+COUNTERS = {}
+
+
+def timed(fn):
+    """Counts calls and time spent in fn, two perf_counter() calls per call. See report_counters()"""
+    counter = COUNTERS.setdefault(fn.__qualname__, TimingCounter(fn.__qualname__))
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            counter.add(time.perf_counter() - started)
+    return wrapper
+
+
+def report_counters() -> str:
+    return '\n'.join(str(counter) for counter in sorted(COUNTERS.values(), key=lambda c: -c.total) if counter.calls)
+
+
+class StackSampler:
+    """Samples the stacks of all threads every interval seconds, cProfile only sees the thread enabling it"""
+
+    def __init__(self, interval=SAMPLING_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self.running = False
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name='stack_sampler', daemon=True)
+
+    def start(self):
+        self.running = True
+        self._thread.start()
+
+    def stop(self):
+        self._keep_going = False
+        self._thread.join()
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+    def _sample(self):
+        names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        while self._keep_going:
+            time.sleep(self.interval)
+            if self.running:
+                self._sample()
+
+    def write_collapsed(self, path):
+        """One 'thread;outer;...;inner count' line per stack, the input of flamegraph.pl and speedscope"""
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+
+class ProfileSession:
+    """cProfile of the main thread, stack sampling of all threads and tracemalloc over a session.
+    toggle() (SIGUSR1 once install_signal() was called) pauses and resumes all three.
+    write() leaves prefix.pstats, prefix.collapsed, prefix.alloc.txt and prefix.counters.txt.
+    The allocation top is the one of the last active period: tracemalloc drops its traces when paused."""
+
+    def __init__(self, prefix=DEFAULT_PREFIX, interval=SAMPLING_INTERVAL):
+        self.prefix = prefix
+        self.running = False
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(interval)
+        self._snapshot = None
+
+    def start(self):
+        self._sampler.start()
+        self.resume()
+
+    def resume(self):
+        if self.running:
+            return
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._profile.enable()
+        self._sampler.running = True
+        self.running = True
+        logger.info('Profiling on')
+
+    def pause(self):
+        if not self.running:
+            return
+        self._profile.disable()
+        self._sampler.running = False
+        self._snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        self.running = False
+        logger.info('Profiling off')
+
+    def toggle(self, *_):
+        if self.running:
+            self.pause()
+        else:
+            self.resume()
+
+    def install_signal(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """The handler runs in the main thread the next time it executes Python code"""
+        if signum is None:
+            logger.warning('No signal to toggle profiling with on this platform')
+            return
+        signal.signal(signum, self.toggle)
+
+    def stop(self):
+        self.pause()
+        self._sampler.stop()
+
+    def write(self):
+        self._profile.dump_stats(self.prefix + '.pstats')
+        self._sampler.write_collapsed(self.prefix + '.collapsed')
+        with open(self.prefix + '.alloc.txt', 'w') as f:
+            if self._snapshot is not None:
+                for stat in self._snapshot.statistics('lineno')[:ALLOC_TOP]:
+                    f.write('{}\n'.format(stat))
+        with open(self.prefix + '.counters.txt', 'w') as f:
+            f.write(report_counters() + '\n')
+        print('Profile written to {}.{{pstats,collapsed,alloc.txt,counters.txt}}'.format(self.prefix))
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', help='Profile the session and write PREFIX.pstats, PREFIX.collapsed, '
+                        'PREFIX.alloc.txt and PREFIX.counters.txt on exit, SIGUSR1 pauses/resumes',
+                        dest='profile', nargs='?', const=DEFAULT_PREFIX, metavar='PREFIX')
+    parser.add_argument('--profile-interval', help='Stack sampling interval, s', dest='profile_interval',
+                        type=float, default=SAMPLING_INTERVAL)
+
+
+@contextmanager
+def profile_from_args(args):
+    """Yields the running ProfileSession, or None without --profile"""
+    if not args.profile:
+        yield None
+        return
+    session = ProfileSession(args.profile, args.profile_interval)
+    session.install_signal()
+    session.start()
+    try:
+        yield session
+    finally:
+        session.stop()
+        session.write()
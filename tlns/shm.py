@@ -0,0 +1,106 @@
+import time
+import struct
+from contextlib import contextmanager
+from logging import getLogger
+from multiprocessing import shared_memory, resource_tracker
+
+from tlns.tlns import Board
+
+logger = getLogger(__name__)
+
+DEFAULT_NAME = 'tlns_board'
+
+# generation (seqlock), width, height
+HEADER = struct.Struct('=QHH')
+HEADER_SIZE = 16
+
+
+class TornRead(Exception):
+    pass
+
+
+class SharedBoard(Board):
+    """Board whose pixels live in a shared memory block, so a producer process can render in place
+    and a transmitter process can encode straight from the same memory.
+    Consistency is kept with a seqlock: the writer makes the generation odd while it modifies the pixels
+    and even again when done, a reader retries if the generation was odd or changed during its read."""
+    READ_RETRIES = 10000
+
+    def __init__(self, name=DEFAULT_NAME, w_=None, h_=None, create=False, untrack=True):
+        if create:
+            w = w_ if w_ else self.WIDTH
+            h = h_ if h_ else self.HEIGHT
+            self._shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + w * h)
+            HEADER.pack_into(self._shm.buf, 0, 0, w, h)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            if untrack:
+                # Attaching registers the block with this process' resource tracker which would unlink it on exit.
+                # Children of the creating process share its tracker and must pass untrack=False.
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+            _, w, h = HEADER.unpack_from(self._shm.buf, 0)
+        self.name = name
+        self._created = create
+        super().__init__(w, h, self._shm.buf[HEADER_SIZE:HEADER_SIZE + w * h])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def generation(self) -> int:
+        return HEADER.unpack_from(self._shm.buf, 0)[0]
+
+    def _set_generation(self, generation):
+        struct.pack_into('=Q', self._shm.buf, 0, generation)
+
+    @contextmanager
+    def write(self):
+        """Pixels changed inside the block are published as one frame"""
+        generation = self.generation
+        self._set_generation(generation + 1)
+        try:
+            yield self
+        finally:
+            self._set_generation(generation + 2)
+
+    def read(self, fn):
+        """Calls fn(pixels) with a memoryview of the pixels and returns (generation, result) once fn ran
+        over a consistent frame. fn must only copy or encode the pixels, its result is discarded on a torn read."""
+        for _ in range(self.READ_RETRIES):
+            generation = self.generation
+            if generation & 1:
+                continue
+            result = fn(self.pix)
+            if self.generation == generation:
+                return generation, result
+        raise TornRead('No consistent frame after {} attempts'.format(self.READ_RETRIES))
+
+    def close(self):
+        """Views of the pixels (Board.array(), the effects' arrays) must be dropped before: while one is alive the
+        block can't be unmapped, it stays mapped until the views are garbage collected and only its name goes"""
+        try:
+            self.pix.release()
+            self._shm.close()
+        except BufferError:
+            logger.warning('Shared board %s closed with views of its pixels alive, left mapped', self.name)
+        if self._created:
+            self._shm.unlink()
+
+
+def transmit(board: SharedBoard, sink, poll_interval=0.001, keep_going=lambda: True):
+    """Transmitter process loop: sends every new generation of the board through the sink.
+    The snapshot is the only copy made, it is what the sink's encoder reads from."""
+    last_generation = None
+    while keep_going():
+        if board.generation == last_generation:
+            time.sleep(poll_interval)
+            continue
+        try:
+            last_generation, frame = board.read(bytes)
+        except TornRead as ex:
+            logger.warning('%s', ex)
+            continue
+        sink.send(frame)
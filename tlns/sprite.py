@@ -0,0 +1,83 @@
+from functools import lru_cache
+
+import numpy as np
+
+from tlns.tlns import PIXEL_MAX_BRIGHTNESS, PIXEL_HALF_BRIGHTNESS, BLEND_OVERWRITE, BLEND_MAX, BLEND_XOR, BLENDS
+
+# Characters of Sprite.from_rows()
+SPRITE_PALETTE = {'.': 0, '+': PIXEL_HALF_BRIGHTNESS, '#': PIXEL_MAX_BRIGHTNESS}
+
+
+class Sprite:
+    """Bitmap drawn onto boards with Board.blit(). pixels is indexed [x, y] like a board, the anchor cell lands
+    on the blit position. Pixels equal to key are transparent. Drawing is one vectorized operation over the part
+    of the sprite left after clipping: overwrite, max (brightest wins) or xor."""
+
+    def __init__(self, pixels, key=None, anchor=(0, 0)):
+        self.pixels = np.ascontiguousarray(pixels, np.uint8)
+        self.w, self.h = self.pixels.shape
+        self.key = key
+        self.anchor = anchor
+        self._opaque = self.pixels != key if key is not None else None
+
+    @classmethod
+    def from_rows(cls, *rows, key=None, centered=False, palette=SPRITE_PALETTE):
+        """Rows of palette characters from top (y = 0) to bottom, the anchor is the top left cell or the center"""
+        pixels = np.array([[palette[c] for c in row] for row in rows], np.uint8).T
+        anchor = (pixels.shape[0] // 2, pixels.shape[1] // 2) if centered else (0, 0)
+        return cls(pixels, key, anchor)
+
+    def draw(self, pixels, x, y, blend=BLEND_OVERWRITE):
+        """pixels: a board's numpy view (Board.array())"""
+        assert blend in BLENDS
+        x -= self.anchor[0]
+        y -= self.anchor[1]
+        w, h = pixels.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + self.w, w), min(y + self.h, h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        dst = pixels[x0:x1, y0:y1]
+        src = self.pixels[x0 - x:x1 - x, y0 - y:y1 - y]
+        where = self._opaque[x0 - x:x1 - x, y0 - y:y1 - y] if self._opaque is not None else True
+        if blend == BLEND_OVERWRITE:
+            np.copyto(dst, src, where=where)
+        elif blend == BLEND_MAX:
+            np.maximum(dst, src, out=dst, where=where)
+        elif blend == BLEND_XOR:
+            np.bitwise_xor(dst, src, out=dst, where=where)
+
+
+class SpriteSheet:
+    """Grid of cell_w x cell_h sprites in an image (anything tlns.playback.open_frames() reads, the first frame),
+    numbered row by row from the top left. A sprite is cut out on first use and kept."""
+
+    def __init__(self, path, cell_w, cell_h, key=None):
+        from tlns.playback import open_frames
+
+        self.image = next(iter(open_frames(path)))
+        self.cell_w = cell_w
+        self.cell_h = cell_h
+        self.key = key
+        self.columns = self.image.shape[1] // cell_w
+        self.rows = self.image.shape[0] // cell_h
+        self._sprites = {}
+
+    def __len__(self):
+        return self.columns * self.rows
+
+    def __getitem__(self, index) -> Sprite:
+        sprite = self._sprites.get(index)
+        if sprite is None:
+            if not 0 <= index < len(self):
+                raise IndexError('Sprite {} out of a sheet of {}'.format(index, len(self)))
+            row, column = divmod(index, self.columns)
+            cell = self.image[row * self.cell_h:(row + 1) * self.cell_h, column * self.cell_w:(column + 1) * self.cell_w]
+            sprite = self._sprites[index] = Sprite(cell.T, self.key)
+        return sprite
+
+
+@lru_cache(maxsize=None)
+def load_sheet(path, cell_w, cell_h, key=None) -> SpriteSheet:
+    """A sheet is read once per process"""
+    return SpriteSheet(path, cell_w, cell_h, key)
@@ -0,0 +1,119 @@
+import time
+
+from tlns.tlns import Board, PIXEL_MAX_BRIGHTNESS
+from tlns.link import DEFAULT_BAUDRATE, wire_time
+
+FIRST_CHAR = ' '
+GLYPH_WIDTH = 5
+GLYPH_HEIGHT = 7
+
+# 5x7 font, printable ASCII from ' ' on: five columns per glyph, bit 0 is the top row
+FONT_5X7 = bytes.fromhex(
+    '0000000000' '00005f0000' '0007000700' '147f147f14' '242a7f2a12' '2313086462' '3649552250' '0005030000'
+    '001c224100' '0041221c00' '082a1c2a08' '08083e0808' '0050300000' '0808080808' '0060600000' '2010080402'
+    '3e5149453e' '00427f4000' '4261514946' '2141454b31' '1814127f10' '2745454539' '3c4a494930' '0171090503'
+    '3649494936' '064949291e' '0036360000' '0056360000' '0814224100' '1414141414' '0041221408' '0201510906'
+    '324979413e' '7e1111117e' '7f49494936' '3e41414122' '7f4141221c' '7f49494941' '7f09090101' '3e41415132'
+    '7f0808087f' '00417f4100' '2040413f01' '7f08142241' '7f40404040' '7f0204027f' '7f0408107f' '3e4141413e'
+    '7f09090906' '3e4151215e' '7f09192946' '4649494931' '01017f0101' '3f4040403f' '1f2040201f' '7f2018207f'
+    '6314081463' '0304780403' '6151494543' '007f414100' '0204081020' '0041417f00' '0402010204' '4040404040'
+    '0001020400' '2054545478' '7f48444438' '3844444420' '384444487f' '3854545418' '087e090102' '081454543c'
+    '7f08040478' '00447d4000' '2040443d00' '007f102844' '00417f4000' '7c04180478' '7c08040478' '3844444438'
+    '7c14141408' '081414187c' '7c08040408' '4854545420' '043f444020' '3c4040207c' '1c2040201c' '3c4030403c'
+    '4428102844' '0c5050503c' '4464544c44' '0008364100' '00007f0000' '0041360800' '0804081008')
+
+
+class Atlas:
+    """Every glyph rasterized once into panel columns of height h: glyph_width * h bytes laid out like Board.pix
+    (column by column), so composing a string is a concatenation of cached glyphs."""
+
+    def __init__(self, h_=None, row=None, val=PIXEL_MAX_BRIGHTNESS, spacing=1, font=FONT_5X7):
+        self.h = h_ if h_ else Board.HEIGHT
+        self.row = row if row is not None else (self.h - GLYPH_HEIGHT) // 2
+        assert 0 <= self.row and self.row + GLYPH_HEIGHT <= self.h
+        self.spacing = spacing
+        self._glyphs = {}
+        for index in range(len(font) // GLYPH_WIDTH):
+            glyph = bytearray()
+            for bits in font[index * GLYPH_WIDTH:(index + 1) * GLYPH_WIDTH]:
+                column = bytearray(self.h)
+                for y in range(GLYPH_HEIGHT):
+                    if bits >> y & 1:
+                        column[self.row + y] = val
+                glyph += column
+            glyph += bytes(self.h * spacing)
+            self._glyphs[chr(ord(FIRST_CHAR) + index)] = bytes(glyph)
+        self._unknown = self._glyphs['?']
+
+    def glyph(self, c) -> bytes:
+        return self._glyphs.get(c, self._unknown)
+
+    def compose(self, text) -> bytearray:
+        return bytearray(b''.join(self.glyph(c) for c in text))
+
+    def columns(self, text) -> int:
+        return len(text) * (GLYPH_WIDTH + self.spacing)
+
+
+def render_text(board: Board, text, atlas: Atlas = None, x=0):
+    """Static text from column x on, cut at the board edge"""
+    atlas = atlas if atlas else Atlas(board.h)
+    assert atlas.h == board.h
+    strip = atlas.compose(text)
+    start = x * board.h
+    end = min(start + len(strip), len(board.pix))
+    if start < end:
+        board.pix[start:end] = strip[:end - start]
+
+
+class Ticker:
+    """Scrolling text: the string is composed once into a strip of blank lead-in, text, gap and a copy of the
+    first w columns, so every scroll position is a contiguous slice of the strip. Each tick yields a Board
+    whose pixels are a memoryview of that slice, nothing is rendered or copied per frame."""
+    GAP = 8
+
+    def __init__(self, text, w_=None, h_=None, atlas: Atlas = None, gap=GAP, step=1):
+        self.w = w_ if w_ else Board.WIDTH
+        self.h = h_ if h_ else Board.HEIGHT
+        self.atlas = atlas if atlas else Atlas(self.h)
+        assert self.atlas.h == self.h
+        self.gap = gap
+        self.step = step
+        self.offset = 0
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.text = text
+        strip = bytearray(self.w * self.h) + self.atlas.compose(text) + bytearray(self.gap * self.h)
+        self.period = len(strip) // self.h
+        strip += strip[:self.w * self.h]
+        self._strip = memoryview(bytes(strip))
+        self.offset %= self.period
+
+    def board(self, offset=None) -> Board:
+        column = self.offset if offset is None else offset % self.period
+        return Board(self.w, self.h, self._strip[column * self.h:(column + self.w) * self.h])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Board:
+        board = self.board()
+        self.offset = (self.offset + self.step) % self.period
+        return board
+
+
+def run_ticker(ticker: Ticker, sink, fps=None, keep_going=lambda: True, baudrate=DEFAULT_BAUDRATE):
+    """Sends ticker frames at fps, without it at the rate the link clocks them out at baudrate. Sinks queueing
+    or coalescing frames return at once, pacing by the wire time keeps the loop from spinning on them."""
+    next_at = time.monotonic()
+    for board in ticker:
+        if not keep_going():
+            return
+        size = sink.send(board.pix)
+        next_at += 1.0 / fps if fps else wire_time(size, baudrate)
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_at = time.monotonic()
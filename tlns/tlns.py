@@ -8,16 +8,26 @@ from collections import OrderedDict
 import sys
 from bitarray import bitarray
 
+from tlns.profiling import timed
+
 logger = getLogger(__name__)
 RUNNING_ON_LINUX = 'linux' in sys.platform.lower()
 
 PIXEL_MAX_BRIGHTNESS = 0xFF
 PIXEL_HALF_BRIGHTNESS = 0x80
+# Character showing a pixel value in the text views of a board: off, dim, bright
+BOARD_GLYPHS = bytes(ord('-') if v == 0 else ord('+') if v <= PIXEL_HALF_BRIGHTNESS else ord('o') for v in range(256))
 
 class Point:
+    """Immutable and hashable, usable as a dict key or a set member"""
+    __slots__ = ('x', 'y')
+
     def __init__(self, x_=0, y_=0):
-        self.x = x_
-        self.y = y_
+        object.__setattr__(self, 'x', x_)
+        object.__setattr__(self, 'y', y_)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Point is immutable')
 
     def __iter__(self):
         return iter((self.x, self.y))
@@ -25,33 +35,100 @@ class Point:
     def __str__(self):
         return str(self.x) + "," + str(self.y)
 
+    def __repr__(self):
+        return 'Point({!r}, {!r})'.format(self.x, self.y)
+
     def __eq__(self, other):
+        if not isinstance(other, Point):
+            return NotImplemented
         return self.x == other.x and self.y == other.y
 
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Point, (self.x, self.y)
+
+
+class Stencil:
+    """Fixed shape given as (dx, dy) offsets around its anchor cell.
+    The offsets are grouped once into vertical runs (dx, first dy, length), which are contiguous in Board.pix,
+    so Board.stamp() writes a column of the shape with one slice assignment."""
+
+    def __init__(self, offsets):
+        self.offsets = tuple(sorted(set(offsets)))
+        runs = []
+        for dx, dy in self.offsets:
+            if runs and runs[-1][0] == dx and runs[-1][1] + runs[-1][2] == dy:
+                runs[-1][2] += 1
+            else:
+                runs.append([dx, dy, 1])
+        self.runs = tuple(tuple(run) for run in runs)
+        self.longest_run = max(run[2] for run in self.runs)
+        self._scaled = {}
+
+    @classmethod
+    def from_rows(cls, *rows):
+        """Rows of '#' (set) and '.' (unset) from top to bottom, the anchor is the center of the picture"""
+        anchor_x, anchor_y = len(rows[0]) // 2, len(rows) // 2
+        return cls((x - anchor_x, y - anchor_y) for y, row in enumerate(rows) for x, c in enumerate(row) if c == '#')
+
+    def points(self, x, y, scale=1) -> list:
+        """Flat [x0, y0, x1, y1, ...] list of the cells around (x, y) spaced by scale, e.g. for QPolygon"""
+        offsets = self._scaled.get(scale)
+        if offsets is None:
+            offsets = self._scaled[scale] = tuple(v * scale for offset in self.offsets for v in offset)
+        return [v + (y if i & 1 else x) for i, v in enumerate(offsets)]
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+STENCIL_TARGET = Stencil.from_rows('###',
+                                   '###',
+                                   '###')
+STENCIL_CROSS = Stencil.from_rows('.#.',
+                                  '###',
+                                  '.#.')
+STENCIL_ARROW = Stencil.from_rows('..#..',
+                                  '.###.',
+                                  '#.#.#',
+                                  '..#..',
+                                  '..#..')
+
+
+BLEND_OVERWRITE = 'overwrite'
+BLEND_MAX = 'max'
+BLEND_XOR = 'xor'
+BLENDS = (BLEND_OVERWRITE, BLEND_MAX, BLEND_XOR)
+
 
 class Board():
     WIDTH = 21
     HEIGHT = 21
 
-    def __init__(self, w_=None, h_=None):
+    def __init__(self, w_=None, h_=None, buf=None):
         self.w = w_ if w_ else self.WIDTH
         self.h = h_ if h_ else self.HEIGHT
-        self.pix = []
-        for _ in range(self.h):
-            row = []
-            for _ in range(self.w):
-                row.append(0)
-            self.pix.append(row)
+        # Flat buffer in wire order: the value set at (x, y) is pix[x * h + y]
+        self.pix = buf if buf is not None else bytearray(self.w * self.h)
+        assert len(self.pix) == self.w * self.h
 
     def set(self, x, y, val=PIXEL_MAX_BRIGHTNESS):
         assert x < self.w
         assert y < self.h
-        self.pix[x][y] = val
+        self.pix[x * self.h + y] = val
 
     def set_quietly(self, x, y, val=PIXEL_MAX_BRIGHTNESS):
         if x >= self.w or y >= self.h:
             return
-        self.pix[x][y] = val
+        self.pix[x * self.h + y] = val
 
     def unset(self,  x, y):
         self.set(x, y, 0)
@@ -59,12 +136,43 @@ class Board():
     def get(self, x, y):
         assert x < self.w
         assert y < self.h
-        return self.pix[y][x]
+        return self.pix[y * self.h + x]
 
     def get_quietly(self, x, y):
         if x >= self.w or y >= self.h:
             return 0
-        return self.pix[y][x]
+        return self.pix[y * self.h + x]
+
+    def stamp(self, stencil: Stencil, x, y, val=PIXEL_MAX_BRIGHTNESS):
+        """Sets every cell of the stencil anchored at (x, y), cells off the board are clipped"""
+        fill = memoryview(bytes((val,)) * stencil.longest_run)
+        for dx, dy, length in stencil.runs:
+            column = x + dx
+            if not 0 <= column < self.w:
+                continue
+            first = max(y + dy, 0)
+            last = min(y + dy + length, self.h)
+            if first < last:
+                base = column * self.h
+                self.pix[base + first:base + last] = fill[:last - first]
+
+    def array(self):
+        """numpy view of pix indexed [x, y], writes to it go to the board"""
+        import numpy as np
+        return np.frombuffer(self.pix, np.uint8).reshape(self.w, self.h)
+
+    def blit(self, sprite, x, y, blend=BLEND_OVERWRITE):
+        """Draws a tlns.sprite.Sprite with its anchor at (x, y), clipped at the board edges"""
+        sprite.draw(self.array(), x, y, blend)
+
+    def plot(self, cells, val=PIXEL_MAX_BRIGHTNESS):
+        """Sets all (x, y) cells, cells off the board are skipped like with set_quietly().
+        A plain loop without a method call per cell: for the few hundred cells of a frame it beats
+        converting the list for a numpy scatter."""
+        pix, w, h = self.pix, self.w, self.h
+        for x, y in cells:
+            if 0 <= x < w and 0 <= y < h:
+                pix[x * h + y] = val
 
     @staticmethod
     def get_pos(point:Point, mul:int=1) -> Point:
@@ -74,43 +182,25 @@ class Board():
         return Point(x*mul, y*mul)
 
     def __str__(self):
-        string = ""
-        for x in reversed(range(self.w)):
-            string = string + str(x) + ':\t'
-            for y in range(self.h):
-                brightness = self.get(x, y)
-                if brightness == 0:
-                    c = '-'
-                elif brightness <= 0x80:
-                     c = '+'
-                else:
-                    c = 'o'
-                string = string + c
-            string = string + '\n'
-        return string
+        # Top row first, a row is every h-th byte of the buffer
+        return ''.join('{}:\t{}\n'.format(y, bytes(self.pix[y::self.h]).translate(BOARD_GLYPHS).decode())
+                       for y in reversed(range(self.h)))
 
     def __bytes__(self):
-        bytes_ = b''
-        pixels = []
-        for x in range(self.w):
-            for y in range(self.h):
-                pixels.append(self.get(y, x))
-
-        return bytearray(pixels)
+        return bytearray(self.pix)
 
+    @timed
     def tobytes(self, inverse=False, mirror_y=False, mirror_x=False):
-        bytes_ = b''
-        pixels = []
+        pixels = bytearray()
         for x in range(self.w):
-            for y in range(self.h):
-                y_final = y if not mirror_y else (self.h - y - 1)
-                x_final = x if not mirror_x else (self.w - x - 1)
-                if not inverse:
-                    pixels.append(self.get(y_final, x_final))
-                else:
-                    pixels.append(self.get(x_final, y_final))
-
-        return bytearray(pixels)
+            x_final = x if not mirror_x else (self.w - x - 1)
+            if not inverse:
+                column = self.pix[x_final * self.h:(x_final + 1) * self.h]
+            else:
+                column = self.pix[x_final::self.h]
+            pixels += column[::-1] if mirror_y else column
+
+        return pixels
 
 
 
@@ -0,0 +1,58 @@
+from array import array
+
+
+class Trail:
+    """Bounded storage of the freehand mouse trail.
+    Samples are kept as interleaved x/y pairs in a preallocated array('h') used as a ring buffer,
+    so the memory is fixed by capacity. A sample closer than min_distance (in pixels, per axis)
+    to the last stored one is dropped as redundant. overwritten counts the samples a full ring has dropped."""
+    DEFAULT_CAPACITY = 8192
+    DEFAULT_MIN_DISTANCE = 2
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, min_distance=DEFAULT_MIN_DISTANCE):
+        assert capacity > 0
+        self.capacity = capacity
+        self.min_distance = min_distance
+        self._xy = array('h', bytes(4 * capacity))
+        self._head = 0
+        self._len = 0
+        self.overwritten = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        xy = self.tolist()
+        return zip(xy[0::2], xy[1::2])
+
+    def last(self):
+        if not self._len:
+            return None
+        idx = 2 * ((self._head - 1) % self.capacity)
+        return self._xy[idx], self._xy[idx + 1]
+
+    def append(self, x, y) -> bool:
+        """Stores the sample, returns False if it was decimated"""
+        last = self.last()
+        if last and abs(x - last[0]) < self.min_distance and abs(y - last[1]) < self.min_distance:
+            return False
+        if self._len == self.capacity:
+            self.overwritten += 1
+        idx = 2 * self._head
+        self._xy[idx] = x
+        self._xy[idx + 1] = y
+        self._head = (self._head + 1) % self.capacity
+        self._len = min(self._len + 1, self.capacity)
+        return True
+
+    def clear(self):
+        self._head = 0
+        self._len = 0
+        self.overwritten = 0
+
+    def tolist(self):
+        """Flat [x0, y0, x1, y1, ...] list from the oldest to the newest sample"""
+        if self._len < self.capacity:
+            return self._xy[:2 * self._len].tolist()
+        split = 2 * self._head
+        return self._xy[split:].tolist() + self._xy[:split].tolist()
@@ -0,0 +1,159 @@
+import time
+import threading
+from collections import deque
+from logging import getLogger
+
+import tinyproto
+
+from tlns.link import DEFAULT_BAUDRATE, LinkStats, open_serial
+
+logger = getLogger(__name__)
+
+
+class FdStats(LinkStats):
+    """frames_sent counts I-frames put on the wire, retransmissions included"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.frames_delivered = 0
+        self.bytes_delivered = 0
+        self.in_flight = 0
+        self.rtt = None
+
+    def goodput(self) -> float:
+        return self.bytes_delivered / max(time.monotonic() - self.started, 1e-9)
+
+    def delivered_fps(self) -> float:
+        return self.frames_delivered / max(time.monotonic() - self.started, 1e-9)
+
+    def retransmits(self) -> int:
+        return max(0, self.frames_sent - self.frames_delivered - self.in_flight)
+
+    def __str__(self):
+        return '{}, delivered {} ({:.1f} fps, goodput {:.0f} B/s), retransmits {}, rtt {}'.format(
+            super().__str__(), self.frames_delivered, self.delivered_fps(), self.goodput(), self.retransmits(),
+            '{:.1f} ms'.format(self.rtt * 1e3) if self.rtt is not None else '-')
+
+
+class FdSink:
+    """Reliable transport on tinyproto's full duplex protocol: sequence numbered I-frames in a sliding window,
+    acked by the peer and retransmitted on timeout, so a corrupted frame is resent instead of being lost.
+    The newest frame waits for a window slot, older ones are dropped (counted as dropped).
+    The peer (panel) has to run tinyproto Fd as well, tlns.emulator.VirtualPanel(protocol='fd') does."""
+    WINDOW = 4
+    MTU = 512
+    SEND_TIMEOUT = 1.0
+    RETRY_TIMEOUT = 0.2
+    RETRIES = 2
+    POLL_INTERVAL = 0.001
+    RTT_SMOOTHING = 0.125
+
+    def __init__(self, device, baudrate=DEFAULT_BAUDRATE, window=WINDOW, mtu=MTU, send_timeout=SEND_TIMEOUT,
+                 retry_timeout=RETRY_TIMEOUT, retries=RETRIES):
+        assert 0 < window < 8  # 3 bit sequence numbers
+        self.stats = FdStats(device)
+        self._p = tinyproto.Fd()
+        self._p.window_size = window
+        self._p.mtu = mtu
+        # Timeouts in ms. A tinyproto without one of them would run on its own default instead of the one asked for
+        for name, value in (('send_timeout', int(send_timeout * 1000)),
+                            ('retry_timeout', int(retry_timeout * 1000)),
+                            ('retries', retries)):
+            if not hasattr(self._p, name):
+                raise AttributeError('tinyproto.Fd has no {}, the installed tinyproto is too old'.format(name))
+            setattr(self._p, name, value)
+        self._ser = open_serial(device, baudrate, timeout=0)
+        self._p.on_send = self._on_delivered
+        self._p.on_read = self._on_read
+        self._p.begin()
+        # Our own tx stream is deframed once more to count the I-frames put on the wire
+        self._tx_monitor = tinyproto.Hdlc()
+        self._tx_monitor.on_read = self._on_tx_frame
+        self._tx_monitor.begin()
+        self._sent_at = deque()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._keep_going = True
+        self._threads = [threading.Thread(target=self._pump, name='fd_pump', daemon=True),
+                         threading.Thread(target=self._run, name='fd_sender', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def send(self, payload) -> int:
+        with self._cond:
+            if self._pending is not None:
+                self.stats.frames_dropped += 1
+            self._pending = bytes(payload)
+            self._cond.notify()
+        return len(payload)
+
+    def in_flight(self) -> int:
+        return self.stats.in_flight
+
+    def _on_read(self, frame):
+        logger.debug('Unexpected frame from the panel: %d bytes', len(frame))
+
+    def _on_delivered(self, frame):
+        now = time.monotonic()
+        self.stats.in_flight = max(0, self.stats.in_flight - 1)
+        self.stats.frames_delivered += 1
+        self.stats.bytes_delivered += len(frame)
+        if self._sent_at:
+            rtt = now - self._sent_at.popleft()
+            stats = self.stats
+            stats.rtt = rtt if stats.rtt is None else stats.rtt + self.RTT_SMOOTHING * (rtt - stats.rtt)
+
+    def _on_tx_frame(self, frame):
+        # address, control, payload: I-frames have bit 0 of control cleared
+        if len(frame) > 1 and not frame[1] & 0x01:
+            self.stats.on_frame()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._keep_going and self._pending is None:
+                    self._cond.wait()
+                if not self._keep_going:
+                    return
+                frame = self._pending
+                self._pending = None
+            self._sent_at.append(time.monotonic())
+            self.stats.in_flight += 1
+            result = self._p.send(frame)
+            if isinstance(result, int) and result < 0:
+                # Window is full, let a newer frame take the slot
+                self._sent_at.pop()
+                self.stats.in_flight -= 1
+                with self._cond:
+                    if self._pending is None:
+                        self._pending = frame
+                    else:
+                        self.stats.frames_dropped += 1
+                time.sleep(self.POLL_INTERVAL)
+
+    def _pump(self):
+        while self._keep_going:
+            data = self._ser.read(self._ser.in_waiting or 1)
+            if data:
+                self._p.rx(data)
+            out = self._p.tx()
+            if out:
+                started = time.monotonic()
+                self._ser.write(out)
+                self.stats.bytes_sent += len(out)
+                self.stats.write_time += time.monotonic() - started
+                self._tx_monitor.rx(out)
+            elif not data:
+                time.sleep(self.POLL_INTERVAL)
+
+    def report(self) -> str:
+        return str(self.stats)
+
+    def close(self):
+        with self._cond:
+            self._keep_going = False
+            self._cond.notify()
+        for thread in self._threads:
+            thread.join()
+        self._p.end()
+        self._ser.close()